@@ -0,0 +1,76 @@
+#   test_LevelLayers.py
+#
+#   run from the repository directory with
+#      python3 -m unittest discover tests
+#
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "web2dmx"))
+
+from LevelLayers import LevelLayers
+
+##################################################################################
+#                               Interface
+#
+#           level buffer standing in for a DMXInterface
+#
+##################################################################################
+
+class Interface(object):
+
+    def __init__(self, size=512):
+        self.level_buffer = bytearray(size)
+
+    def setDMXSlots(self, slots):
+        for a, v in slots:
+            self.level_buffer[a-1] = v
+
+    def getDMXValue(self, address):
+        return self.level_buffer[address-1]
+
+##################################################################################
+#                               LevelLayersTest
+#
+##################################################################################
+
+class LevelLayersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.interface = Interface()
+        self.layers = LevelLayers(self.interface, "ltp", 100, 60)
+
+    def fold(self, key):
+        with self.layers.lock:
+            self.layers.fold(self.layers.layers[key])
+
+    def test_fold_keeps_output(self):
+        self.layers.setValues("10.0.0.1", [(1, 200), (2, 50)])
+        self.layers.setValues("10.0.0.2", [(2, 80)])
+        before = bytes(self.interface.level_buffer)
+        self.fold("10.0.0.1")
+        self.fold("10.0.0.2")
+        self.assertEqual(len(self.layers.layers), 1)
+        self.assertEqual([self.layers.resolve(a) for a in (1, 2)], [200, 80])
+        self.assertEqual(bytes(self.interface.level_buffer), before)
+
+    def test_release_folded(self):
+        self.layers.setValues("10.0.0.1", [(1, 200)])
+        self.fold("10.0.0.1")
+        self.layers.release("10.0.0.1")
+        self.assertEqual(self.interface.level_buffer[0], 0)
+        self.assertEqual(len(self.layers.layers), 0)
+
+    def test_release_folded_key_with_new_layer(self):
+        self.layers.setValues("10.0.0.1", [(1, 200)])
+        self.fold("10.0.0.1")
+        self.layers.setValues("10.0.0.1", [(2, 100)])
+        self.layers.release("10.0.0.1")
+        self.assertEqual(self.interface.level_buffer[0:2], bytearray([0, 0]))
+        self.assertEqual(len(self.layers.layers), 0)
+        self.assertEqual(len(self.layers.slot_layers), 0)
+
+if __name__ == "__main__":
+    unittest.main()
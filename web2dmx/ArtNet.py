@@ -9,27 +9,40 @@
 #   Art-Net(TM) Designed by and Copyright Artistic Licence Holdings Ltd.
 
 
+import asyncio
 import socket
 import threading
 import time
+import os
+import json
 import ipaddress
-from select import select
 from CTNetUtil import CTNetUtil
+import ArtNetCodec
 
 ##################################################################################
 #                               DMXInterface
 #
 #           An abstract super class for DMX over network protocols
 #
+#           sending and listening share one asyncio event loop thread
+#           socket reads, periodic refresh and other timers are loop callbacks
+#
 ##################################################################################
 
 class DMXInterface(object):
     
     def __init__(self):
-        self.send_thread = None
-        self.listen_thread = None
+        self.loop = None
+        self.loop_thread = None
+        self.refresh_timer = None
+        self.sending = False
+        self.listening = False
         self.lock = threading.Lock()
         self.last_send_time = 0.0
+        self.generation = 0
+        self.frame_listeners = []
+        self.receive_buffer = bytearray(1024)
+        self.receive_view = memoryview(self.receive_buffer)
         self.ok = False
 
 ########################################
@@ -60,39 +73,81 @@ class DMXInterface(object):
         print ("setDMXValues")
         self.sending = False
 
+#########################################
+#
+#   setDMXSlots
+#      sets level_buffer from list of (address, value) pairs
+#
+#########################################
+    def setDMXSlots(self, slots):
+        with self.lock:
+            for a, v in slots:
+                self.level_buffer[a-1] = v
+
+########################################
+#
+#   startLoop
+#      creates the event loop and the thread that runs it
+#      a selector loop is used so the socket can be read with add_reader
+#   callOnLoop schedules callback on the loop from any thread
+#   stopLoop ends the loop thread, cancelling anything scheduled
+#
+#########################################
+    def startLoop(self):
+        if ( self.loop == None ):
+            self.loop = asyncio.SelectorEventLoop()
+            self.loop_thread = threading.Thread(target=self.loop.run_forever)
+            self.loop_thread.daemon = True
+            self.loop_thread.start()
+
+    def callOnLoop(self, callback, *args):
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def stopLoop(self):
+        if ( self.loop != None ):
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.loop_thread.join()
+            self.loop.close()
+            self.loop = None
+            self.loop_thread = None
+
 ########################################
 #
 #   startSending
-#      creates a thread that sends UDP DMX packets
+#      starts the event loop and schedules periodic sending
 #
 #########################################
     def startSending(self):
+        self.startLoop()
         self.sending = True
-        if self.send_thread is None:
-            self.send_thread = threading.Thread(target=self.send)
-            self.send_thread.daemon = True
-            self.send_thread.start()
+        self.callOnLoop(self.sendingStarted)
+
+    def sendingStarted(self):
+        self.scheduleRefresh(0)
 
 ########################################
 #
-#   send
-#      method to be attached to a thread (don't call directly)
-#      periodically calls sendDMXNow,
+#   refresh
+#      loop timer that calls sendDMXNow if nothing was sent for 2 seconds
 #      you can call sendDMXNow directly to force an immediate update
 #
 #########################################
-    def send(self):
-        while self.sending:
-            st = time.time() - self.last_send_time
-            if  st >= 2:
-                try:
-                    self.sendDMXNow()
-                except:
-                    self.sending = False
-            else:
-                time.sleep(2-st)
-        self.send_thread = None
-        self.sending = False
+    def scheduleRefresh(self, delay):
+        self.refresh_timer = self.loop.call_later(delay, self.refresh)
+
+    def refresh(self):
+        self.refresh_timer = None
+        if ( not self.sending ):
+            return
+        st = time.time() - self.last_send_time
+        if  st >= 2:
+            try:
+                self.sendDMXNow()
+            except:
+                self.sending = False
+                return
+            st = 0
+        self.scheduleRefresh(2-st)
 
 #########################################
 #
@@ -103,43 +158,110 @@ class DMXInterface(object):
     def sendDMXNow(self):
         print ("sendDMXNow")
 
+#########################################
+#
+#   publishFrame
+#      if level_buffer changed since the last frame, increments generation,
+#      calls translateLevels and tells frame listeners which slots changed
+#      called with lock held, returns True if the frame changed
+#
+#########################################
+    def publishFrame(self):
+        if ( self.level_buffer == self.published_levels ):
+            return False
+        changes = None
+        if ( len(self.frame_listeners) > 0 ):
+            changes = DMXInterface.changedSlots(self.published_levels, self.level_buffer)
+        self.published_levels[:] = self.level_buffer
+        self.generation += 1
+        self.translateLevels()
+        for listener in self.frame_listeners:
+            listener.frameChanged(self.generation, changes)
+        return True
+
+#########################################
+#
+#   translateLevels   OVERRIDE THIS METHOD
+#      copies level_buffer to output
+#
+#########################################
+    def translateLevels(self):
+        print ("translateLevels")
+
+#########################################
+#
+#   changedSlots
+#      returns list of (address, value) where b differs from a
+#      compares 64 slot blocks before individual slots
+#
+#########################################
+    def changedSlots(a, b):
+        changes = []
+        for s in range(0, len(b), 64):
+            if ( a[s:s+64] != b[s:s+64] ):
+                for i in range(s, min(s+64, len(b))):
+                    if ( a[i] != b[i] ):
+                        changes.append((i+1, b[i]))
+        return changes
+
+#########################################
+#
+#   addFrameListener and removeFrameListener
+#      listener must respond to frameChanged(generation, changes)
+#      changes is a list of (address, value) pairs
+#      frameChanged is called with lock held and should return quickly
+#
+#########################################
+    def addFrameListener(self, listener):
+        with self.lock:
+            self.frame_listeners = self.frame_listeners + [listener]
+
+    def removeFrameListener(self, listener):
+        with self.lock:
+            self.frame_listeners = [l for l in self.frame_listeners if l != listener]
+
 #########################################
 #
 #   stopSending
-#      ends the sending thread by setting a flag
+#      cancels periodic sending
 #
 #########################################
     def stopSending(self):
-        while self.send_thread != None:
-            self.sending = False
+        self.sending = False
+        if ( self.loop != None ):
+            self.callOnLoop(self.sendingStopped)
+
+    def sendingStopped(self):
+        if ( self.refresh_timer != None ):
+            self.refresh_timer.cancel()
+            self.refresh_timer = None
 
 #########################################
 #
 #   close
-#      stops sending and listening
+#      stops sending and listening and ends the loop thread
 #
 #########################################
     def close(self):
         self.stopSending()
         self.stopListening()
+        self.stopLoop()
         self.udpsocket.close()
 
 #########################################
 #
-#   startListening creates a thread that runs the listen() method
+#   startListening adds the socket to the event loop's readers
 #
 #########################################
     
     def startListening(self):
+        self.startLoop()
         self.listening = True
-        if ( self.listen_thread is None ):
-            self.listen_thread = threading.Thread(target=self.listen)
-            self.listen_thread.daemon = True
-            self.listen_thread.start()
+        self.callOnLoop(self.loop.add_reader, self.udpsocket, self.receive)
 
 #########################################
 #
-#   stopListening sets a flag which will cause the listen loop to end on the next pass
+#   stopListening removes the socket from the event loop's readers
 #   setting the delegate to None prevents messages from being sent after stopListening
 #   is called.
 #
@@ -147,27 +269,23 @@ class DMXInterface(object):
     def stopListening(self):
         self.delegate = None
         self.listening = False
+        if ( self.loop != None ):
+            self.callOnLoop(self.loop.remove_reader, self.udpsocket)
         
 #########################################
 #
-#   listen contains a loop that runs while the self.listening flag is True
-#   listen uses select to determine if there is data available from the port
-#   if there is, packetReceived is called
-#   if not, the thread sleeps for a tenth of a second
+#   receive is called by the event loop when the socket is readable
+#   the packet is received into receive_buffer,
+#   self.data is set to a memoryview of the packet and packetReceived is called
 #
 #########################################
-    def listen(self):
-        input = [self.udpsocket]
-
-        while self.listening:
-            inputready,outputready,exceptready = select(input,[],[],0)
-            if ( len(inputready) == 1 ):
-                with self.lock:
-                    self.data, self.recdaddr = self.udpsocket.recvfrom(256)
-                self.packetReceived()
-            else:
-                time.sleep(0.1)
-        self.listen_thread = None
+    def receive(self):
+        try:
+            n, self.recdaddr = self.udpsocket.recvfrom_into(self.receive_buffer)
+        except (BlockingIOError, InterruptedError):
+            return
+        self.data = self.receive_view[0:n]
+        self.packetReceived()
 
 #########################################
 #
@@ -214,6 +332,23 @@ class ArtNetInterface(DMXInterface):
         self.setArtnetSubnet(subnet)
         self.setArtnetUniverse(univ)
         
+        self.curves = None
+        self.recorder = None
+        self.target_map = {}
+        self.node_cache = None
+        self.node_rates = {}
+        self.default_node_rate = 0
+        self.poll_address = "255.255.255.255"
+        self.poll_timer = None
+        self.setPollIntervals(0.5, 4.0)
+        self.reply_destinations = set()
+        self.reply_timer = None
+        self.poll_reply_window = 0.1
+        self.opcode_handlers = {
+            ArtNetCodec.OP_DMX: self.artDMXReceived,
+            ArtNetCodec.OP_POLL: self.artPollReceived,
+            ArtNetCodec.OP_POLL_REPLY: self.artPollReplyReceived }
+
         self.setupSocket()
         self.setupSendBuffer()
         self.setupArtPollBuffer()
@@ -238,6 +373,9 @@ class ArtNetInterface(DMXInterface):
     def setArtnetUniverse(self, u):
         self.artnet_universe = 0x07 & u
 
+    def portAddress(self):
+        return (self.artnet_net << 8) | (self.artnet_subnet << 4) | self.artnet_universe
+
 ########################################
 #
 #   dmx2level and level2dmx
@@ -274,17 +412,15 @@ class ArtNetInterface(DMXInterface):
 #
 #   setupSendBuffer
 #   pre-fill header info for sending DMX packets
-#   send_buffer also holds DMX data for output
+#   level_buffer holds DMX data which is copied into
+#   send_buffer through any dimmer curves when a frame is published
 #
 #########################################
     def setupSendBuffer(self):
-        self.send_buffer = bytearray(529)
-        try:
-            self.send_buffer[0:6] = "Art-Net"
-        except:
-            self.send_buffer[0:6] = bytes("Art-Net", 'utf-8')
-            #python 3
-        self.send_buffer[7] = 0
+        self.level_buffer = bytearray(512)
+        self.published_levels = bytearray(512)
+        self.send_buffer = bytearray(530)
+        self.send_buffer[0:8] = b"Art-Net\x00"
         self.send_buffer[8] = 0      #opcode l/h
         self.send_buffer[9] = 0x50
         self.send_buffer[10] = 0     #version h/l
@@ -297,6 +433,7 @@ class ArtNetInterface(DMXInterface):
         self.send_buffer[17] = 0
         for i in range(512):
             self.send_buffer[i+18] = 0
+        assert len(self.send_buffer) == 530
 
 ########################################
 #
@@ -363,33 +500,94 @@ class ArtNetInterface(DMXInterface):
         self.pollreply_buffer[186] = self.artnet_universe 
         self.pollreply_buffer[200] = 1  # controller
 
-    def startSending(self):
-        self.sendArtPoll()
-        super().startSending()
 ########################################
 #
-#   send
-#   override of send() to also periodically send Art-Net polls for device discovery
+#   sendingStarted
+#      sends the first ArtPoll and schedules the poll timer
+#   sendingStopped cancels the poll timer
 #
 #########################################
-    def send(self):
-        while self.sending:
-            st = time.time() - self.last_send_time
-            if  st >= 2:
-                try:
-                    self.sendDMXNow()
-                except:
-                    self.sending = False
-            else:
-                pt = time.time() - self.last_poll_time
-                if  pt >= 4:
-                    self.removeExpiredTargets()
-                    self.sendArtPoll()
-                    self.last_poll_time = time.time()
-                else:
-                    time.sleep(2-st)
-        self.send_thread = None
-        self.sending = False
+    def sendingStarted(self):
+        super().sendingStarted()
+        self.pollTimer()
+
+    def sendingStopped(self):
+        super().sendingStopped()
+        if ( self.poll_timer != None ):
+            self.poll_timer.cancel()
+            self.poll_timer = None
+
+########################################
+#
+#   setPollIntervals
+#      polls are sent every min_interval after startup or a change in nodes
+#      the interval doubles after each poll up to max_interval
+#      nodes expire if they do not reply for three times max_interval
+#
+#   setPollAddress sets where ArtPolls are sent (default 255.255.255.255)
+#
+#   topologyChanged restarts the burst of polls, called on the loop thread
+#
+#########################################
+    def setPollIntervals(self, min_interval, max_interval):
+        self.min_poll_interval = min_interval
+        self.max_poll_interval = max(min_interval, max_interval)
+        self.node_timeout = 3 * self.max_poll_interval
+        self.poll_interval = min_interval
+
+    def setPollAddress(self, address):
+        self.poll_address = address
+
+########################################
+#
+#   setNodeRates
+#      limits the ArtDMX packets per second sent to each node
+#      rates-> dictionary of node address or "oem_CODE" (4 hex digits) to rate
+#      default_rate-> rate of other nodes that do not report a refresh rate
+#      a rate of 0 is no limit
+#
+#   rateForNode returns the rate for node's address, then its OEM code,
+#      then the refresh rate in its ArtPollReply, then the default rate
+#
+#########################################
+    def setNodeRates(self, rates, default_rate=0):
+        self.node_rates = rates
+        self.default_node_rate = default_rate
+        for n in self.target_list:
+            n.setMaxRate(self.rateForNode(n))
+
+    def rateForNode(self, node):
+        rate = self.node_rates.get(node.address)
+        if ( rate == None and node.reply != None ):
+            rate = self.node_rates.get("oem_%04x" % node.reply.oem)
+            if ( rate == None and node.reply.refresh_rate > 0 ):
+                rate = node.reply.refresh_rate
+        if ( rate == None ):
+            rate = self.default_node_rate
+        return rate
+
+    def topologyChanged(self):
+        self.poll_interval = self.min_poll_interval
+        self.saveNodeCache()
+        if ( self.poll_timer != None ):
+            self.poll_timer.cancel()
+            self.poll_timer = self.loop.call_later(self.poll_interval, self.pollTimer)
+
+########################################
+#
+#   pollTimer
+#   loop timer that removes expired nodes and sends an Art-Net poll for device discovery
+#   polls burst after startup or a change in nodes and back off when stable
+#
+#########################################
+    def pollTimer(self):
+        self.poll_timer = None
+        if ( not self.sending ):
+            return
+        self.removeExpiredTargets()
+        self.sendArtPoll()
+        self.poll_timer = self.loop.call_later(self.poll_interval, self.pollTimer)
+        self.poll_interval = min(self.poll_interval * 2, self.max_poll_interval)
 
 ########################################
 #
@@ -403,58 +601,130 @@ class ArtNetInterface(DMXInterface):
             self.seqcounter = 0
         self.send_buffer[12] = self.seqcounter
 
+########################################
+#
+#   setDimmerCurves
+#      curves-> DimmerCurves object or None for linear output
+#
+#########################################
+    def setDimmerCurves(self, curves):
+        with self.lock:
+            if ( curves != None and curves.isLinear() ):
+                curves = None
+            self.curves = curves
+            self.translateLevels()
+
+########################################
+#
+#   setRecorder
+#      recorder-> DMXRecorder logging sent and received frames or None
+#
+#########################################
+    def setRecorder(self, recorder):
+        with self.lock:
+            self.recorder = recorder
+
+########################################
+#
+#   translateLevels
+#      copies level_buffer into send_buffer, translating through dimmer curves
+#      called with lock held
+#
+#########################################
+    def translateLevels(self):
+        if ( self.curves == None ):
+            self.send_buffer[18:530] = self.published_levels
+        else:
+            self.curves.applyCurves(self.published_levels, self.send_buffer, 18)
+
 ########################################
 #
 #   sendDMXNow
-#   updates the counter and sends ArtDMX packet
+#   updates the counter, publishes levels and sends ArtDMX packet
+#   a node sent to less than its minimum interval ago is not sent this frame,
+#   instead one deferred send is scheduled for when its interval has passed
 #
 #########################################
     def sendDMXNow(self):
         self.updateCounter()
+        deferred = []
         with self.lock:
+            self.publishFrame()
+            if ( self.recorder != None ):
+                self.recorder.recordFrame(False, self.portAddress(), self.published_levels)
             if ( self.unicast_ip == None ):
+                now = time.monotonic()
                 for n in self.target_list:
-                    self.udpsocket.sendto(self.send_buffer, (n.address, self.port()))
+                    if ( now - n.last_send >= n.min_interval ):
+                        self.udpsocket.sendto(self.send_buffer, (n.address, self.port()))
+                        n.last_send = now
+                    elif ( not n.deferred ):
+                        n.deferred = True
+                        deferred.append(n)
             else:
                 self.udpsocket.sendto(self.send_buffer, ( self.unicast_ip, self.port()))
         self.last_send_time = time.time()
+        for n in deferred:
+            self.callOnLoop(self.deferSend, n)
+
+########################################
+#
+#   deferSend
+#      loop callback that schedules sendDeferred at the end of node's interval
+#   sendDeferred sends the latest published frame to node
+#      unless it has expired since the send was deferred
+#
+#########################################
+    def deferSend(self, node):
+        delay = node.last_send + node.min_interval - time.monotonic()
+        self.loop.call_later(max(delay, 0), self.sendDeferred, node)
+
+    def sendDeferred(self, node):
+        with self.lock:
+            node.deferred = False
+            if ( self.target_map.get(node.address) == node ):
+                self.udpsocket.sendto(self.send_buffer, (node.address, self.port()))
+                node.last_send = time.monotonic()
 
 ########################################
 #
-#   setDMXValue sets slot directly in DMX packet buffer
+#   setDMXValue sets slot in level buffer
 #
 #   setDMXLevel converts level (0-100) to (0-255) and 
-#      sets slot directly in DMX packet buffer
+#      sets slot in level buffer
+#
+#   levels are copied to the DMX packet buffer by publishFrame
 #
 #########################################
     def setDMXValue(self, address, value):
         with self.lock:
-            self.send_buffer[address+17] = value
+            self.level_buffer[address-1] = value
 
     def setDMXLevel(self, address, level):
-        self.send_buffer[address+17] = ArtNetInterface.level2dmx(level)
+        self.level_buffer[address-1] = ArtNetInterface.level2dmx(level)
 
 ########################################
 #
-#   setDMXValues sets slots directly in DMX packet buffer
+#   setDMXValues sets slots in level buffer
 #
 #########################################
     def setDMXValues(self, values):
         with self.lock:
-            for i in range (len(values)):
-                self.send_buffer[18+i] = values[i]
+            n = min(len(values), 512)
+            self.level_buffer[0:n] = values[0:n]
 
 ########################################
 #
-#   getDMXValue returns slot directly from DMX packet buffer (0-255)
-#   getDMXLevel returns level (0-100) from DMX packet buffer 
+#   getDMXValue returns slot from level buffer (0-255)
+#   getDMXLevel returns level (0-100) from level buffer
+#      values are before any dimmer curve is applied
 #
 #########################################
     def getDMXValue(self, address):
-        return self.send_buffer[address+17]
+        return self.level_buffer[address-1]
 
     def getDMXLevel(self, address):
-        return ArtNetInterface.dmx2level(self.send_buffer[address+17])
+        return ArtNetInterface.dmx2level(self.level_buffer[address-1])
 
 ########################################
 #
@@ -470,17 +740,15 @@ class ArtNetInterface(DMXInterface):
 ########################################
 #
 #   packetReceived called when listen() thread receives data received at Art-Net port
+#   opcode_handlers maps opcodes to methods
 #
 #########################################
     def packetReceived(self):
-        if ( self.data[0:7] == bytes("Art-Net", 'utf-8')):
-            opcode =  self.data[8] + 256 * self.data[9]
-            if ( opcode == 0x5000 ):
-                self.artDMXReceived()
-            elif ( opcode == 0x2000 ):
-                self.sendArtPollReply()
-            elif ( opcode == 0x2100 ):
-                self.artPollReplyReceived()
+        opcode = ArtNetCodec.opcode(self.data)
+        if ( opcode != None ):
+            handler = self.opcode_handlers.get(opcode)
+            if ( handler != None ):
+                handler()
             else:
                 print ( "unsupported opcode ", opcode )
 
@@ -491,7 +759,7 @@ class ArtNetInterface(DMXInterface):
 #########################################
     def sendArtPoll(self):
         with self.lock:
-            self.udpsocket.sendto(self.artpoll_buffer, ("255.255.255.255", self.port()))
+            self.udpsocket.sendto(self.artpoll_buffer, (self.poll_address, self.port()))
         self.last_poll_time = time.time()
 
 ########################################
@@ -510,37 +778,45 @@ class ArtNetInterface(DMXInterface):
 
 ########################################
 #
-#   replyMatchesNetwork
-#      returns 1 if poll reply matches one port's 
-#      output from network universe to self.artnet_universe
+#   setPollReplyWindow
+#      polls received within window seconds of the first are answered together
+#      with at most one reply to each network
 #
 #########################################
-    def replyMatchesNetwork(self):
-        if ( (self.data[174] & 0x80) != 0 ):    #node's port 1 can output from network
-            if ( self.data[190] == self.artnet_universe ):
-                return 1
-        elif ( (self.data[175] & 0x80) != 0 ):
-            if ( self.data[191] == self.artnet_universe ):
-                return 1
-        elif ( (self.data[176] & 0x80) != 0 ):
-            if ( self.data[192] == self.artnet_universe ):
-                return 1
-        elif ( (self.data[177] & 0x80) != 0 ):
-            if ( self.data[193] == self.artnet_universe ):
-                return 1
-        return 0
+    def setPollReplyWindow(self, window):
+        self.poll_reply_window = window
+
+########################################
+#
+#   artPollReceived
+#      adds the broadcast address of the ArtPoll sender's network to the
+#      pending reply destinations and schedules sendArtPollReply
+#      at the end of the window
+#
+#########################################
+    def artPollReceived(self):
+        self.reply_destinations.add(CTNetUtil.findBroadcastAddress(self.recdaddr[0]))
+        if ( self.reply_timer == None ):
+            self.reply_timer = self.loop.call_later(self.poll_reply_window, self.sendArtPollReply)
 
 ########################################
 #
-#   sendArtPollReply ->send reply to Art-Net poll
-#   reply to broadcast address of ArtPoll sender
+#   sendArtPollReply ->send reply to Art-Net polls
+#   loop timer that encodes the reply once and sends it to each pending network
+#   the socket is thread safe so this does not wait for the lock held by DMX sends
 #
 #########################################
     def sendArtPollReply(self):
+        self.reply_timer = None
         self.updatePollReplyCounter()
-        netbroadcastip = CTNetUtil.findBroadcastAddress(self.recdaddr[0])
-        with self.lock:
-            self.udpsocket.sendto(self.pollreply_buffer, (netbroadcastip, self.port()))
+        packet = bytes(self.pollreply_buffer)
+        destinations = self.reply_destinations
+        self.reply_destinations = set()
+        for d in destinations:
+            try:
+                self.udpsocket.sendto(packet, (d, self.port()))
+            except OSError as e:
+                print ("ArtPollReply error ", e)
 
 ########################################
 #
@@ -549,10 +825,9 @@ class ArtNetInterface(DMXInterface):
 #########################################
     def artPollReplyReceived(self):
         if ( self.data[26:35] != self.namebytes ):
-            if ( self.data[18] == self.artnet_net ):  # matches net, subnet
-                if ( self.data[19] == self.artnet_subnet ):
-                    if ( self.replyMatchesNetwork() == 1 ):
-                        self.foundNode(self.recdaddr[0])
+            reply = ArtNetCodec.decodePollReply(self.data)
+            if ( reply.outputsUniverse(self.portAddress()) ):
+                self.foundNode(self.recdaddr[0], reply)
 
 ########################################
 #
@@ -562,54 +837,134 @@ class ArtNetInterface(DMXInterface):
     def artDMXReceived(self):
         if ( self.recd_from_local() == 0 ):
             print (" Art DMX ", self.recdaddr[0])
+            recorder = self.recorder
+            if ( recorder != None and len(self.data) > ArtNetCodec.ARTDMX_HEADER.size ):
+                sequence, universe, count = ArtNetCodec.decodeDMXHeader(self.data)
+                count = min(count, len(self.data) - 18)
+                recorder.recordFrame(True, universe, self.data[18:18+count])
 
 ########################################
 #
 #   foundNode
 #      append to target list, remove broadcast ip 
-#      if node previously found, update polltime
+#      if node previously found, update polltime and reply
+#      reply-> decoded ArtPollReply
 #
 #########################################
-    def foundNode( self, ipaddr ):
+    def foundNode( self, ipaddr, reply=None ):
         if (self.unicast_ip == None):
             x = self.targetWithAddress(ipaddr)
             if ( x == None ):
-                self.target_list.append(ArtNetNode(ipaddr))
+                node = ArtNetNode(ipaddr, reply)
+                node.setMaxRate(self.rateForNode(node))
+                self.addTarget(node)
                 print( "added node: ", ipaddr )
+                self.topologyChanged()
             else:
-                x.pollReceived()
+                x.pollReceived(reply)
+                x.setMaxRate(self.rateForNode(x))
+                if ( x.cached ):
+                    x.cached = False
+                    self.saveNodeCache()
+
+    def addTarget(self, node):
+        with self.lock:
+            self.target_list = self.target_list + [node]
+            self.target_map[node.address] = node
 
     def targetWithAddress(self, ipaddr):
-        for n in self.target_list:
-            if ( n.address == ipaddr ):
-                return n
-        return None
+        return self.target_map.get(ipaddr)
 
     def removeExpiredTargets(self):
         expired = []
         for n in self.target_list:
-            if ( n.expired() == 1 ):
+            if ( n.expired(self.node_timeout) == 1 ):
                 expired.append(n)
-        for n in expired:
-            self.target_list.remove(n)
-            print("removed node with address ", n.address)
+        if ( len(expired) > 0 ):
+            with self.lock:
+                self.target_list = [n for n in self.target_list if n not in expired]
+                for n in expired:
+                    self.target_map.pop(n.address, None)
+            for n in expired:
+                print("removed node with address ", n.address)
+            self.topologyChanged()
+
+########################################
+#
+#   setNodeCache
+#      path-> file where known nodes are saved
+#      nodes saved for this universe are added as targets immediately
+#      so output starts before they reply to polls
+#      nodes that do not reply expire normally
+#
+#########################################
+    def setNodeCache(self, path):
+        self.node_cache = path
+        if ( self.unicast_ip != None or not os.path.exists(path) ):
+            return
+        try:
+            with open(path, 'r') as f:
+                cache = json.load(f)
+            if ( cache.get("port_address") == self.portAddress() ):
+                for address in cache.get("nodes", []):
+                    if ( self.targetWithAddress(address) == None ):
+                        node = ArtNetNode(address)
+                        node.cached = True
+                        node.setMaxRate(self.rateForNode(node))
+                        self.addTarget(node)
+                        print( "cached node: ", address )
+        except (OSError, ValueError) as e:
+            print ("Node cache error: ", e)
+
+    def saveNodeCache(self):
+        if ( self.node_cache == None ):
+            return
+        nodes = [n.address for n in self.target_list if not n.cached]
+        try:
+            tmp = self.node_cache + ".tmp"
+            with open(tmp, 'w') as f:
+                json.dump({"port_address": self.portAddress(), "nodes": nodes}, f)
+            os.replace(tmp, self.node_cache)
+        except OSError as e:
+            print ("Node cache error: ", e)
 
 ##################################################################################
 #                               ArtNetNode
 #
-#           encapsulates artnet node's ipaddress from ArtPoll and the time it last polled
+#           encapsulates artnet node's ipaddress from ArtPoll, the time it last polled,
+#           its last decoded ArtPollReply and the pacing of ArtDMX sent to it
 #
 ##################################################################################
 class ArtNetNode(object):
 
-    def __init__(self, ipaddr):
+    def __init__(self, ipaddr, reply=None):
         self.address = ipaddr
+        self.reply = reply
+        self.cached = False
         self.polltime = time.time()
+        self.max_rate = 0
+        self.min_interval = 0.0
+        self.last_send = 0.0
+        self.deferred = False
+
+########################################
+#
+#   setMaxRate sets ArtDMX packets per second, 0 for no limit
+#
+#########################################
+    def setMaxRate(self, rate):
+        self.max_rate = rate
+        if ( rate > 0 ):
+            self.min_interval = 1.0 / rate
+        else:
+            self.min_interval = 0.0
     
-    def pollReceived(self):
+    def pollReceived(self, reply=None):
         self.polltime = time.time()
+        if ( reply != None ):
+            self.reply = reply
         
-    def expired(self):
-        if ( time.time()-self.polltime > 12 ):
+    def expired(self, timeout=12):
+        if ( time.time()-self.polltime > timeout ):
             return 1
         return 0
\ No newline at end of file
@@ -0,0 +1,174 @@
+#   ArtNetCodec.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+#   Art-Net(TM) Designed by and Copyright Artistic Licence Holdings Ltd.
+
+#################################################################
+#
+#   This file contains precompiled struct layouts for Art-Net packets
+#   and decoding of received packets
+#   and encoding of ArtPollReply for simulated nodes
+#
+#   layouts are unpacked directly from the receive buffer (bytes or memoryview)
+#
+#################################################################
+
+import struct
+from collections import namedtuple
+
+ARTNET_ID = b"Art-Net\x00"
+
+OP_POLL = 0x2000
+OP_POLL_REPLY = 0x2100
+OP_DMX = 0x5000
+
+#   ID, OpCode (little endian)
+ARTNET_HEADER = struct.Struct("<8sH")
+
+#   ID, OpCode, ProtVerHi, ProtVerLo, Sequence, Physical, SubUni, Net, LengthHi, LengthLo
+ARTDMX_HEADER = struct.Struct("<8sHBBBBBBBB")
+
+ARTPOLLREPLY_LENGTH = 239
+
+#   ArtPollReply through Status2, 213 bytes
+ARTPOLLREPLY = struct.Struct(
+    "<8sH4sH"       # ID, OpCode, IP Address, Port
+    "BBBBBBB"       # VersInfoHi, VersInfoLo, NetSwitch, SubSwitch, OemHi, OemLo, UbeaVersion
+    "BH"            # Status1, EstaMan
+    "18s64s64s"     # ShortName, LongName, NodeReport
+    "BB4s4s4s4s4s"  # NumPortsHi, NumPortsLo, PortTypes, GoodInput, GoodOutputA, SwIn, SwOut
+    "BBB3xB"        # AcnPriority, SwMacro, SwRemote, spare, Style
+    "6s4sBB"        # MAC, BindIp, BindIndex, Status2
+)
+
+#   RefreshRate (big endian) added in Art-Net 4, 0 from nodes that do not report it
+ARTPOLLREPLY_REFRESH = struct.Struct(">H")
+ARTPOLLREPLY_REFRESH_OFFSET = 226
+
+##################################################################################
+#                               ArtPollReply
+#
+#           decoded ArtPollReply node record
+#
+##################################################################################
+
+class ArtPollReply(namedtuple("ArtPollReply",
+        "ip port version net subnet oem ubea status esta short_name long_name node_report "
+        "num_ports port_types good_input good_output sw_in sw_out "
+        "acn_priority sw_macro sw_remote style mac bind_ip bind_index status2 refresh_rate")):
+
+    __slots__ = ()
+
+    def shortName(self):
+        return cString(self.short_name)
+
+    def longName(self):
+        return cString(self.long_name)
+
+    def nodeReport(self):
+        return cString(self.node_report)
+
+    def ipAddress(self):
+        return "%d.%d.%d.%d" % tuple(self.ip)
+
+    def macAddress(self):
+        return ":".join("%02x" % b for b in self.mac)
+
+#########################################
+#
+#   outputUniverses
+#      returns list of 15 bit port addresses of ports that output from Art-Net
+#
+#########################################
+    def outputUniverses(self):
+        universes = []
+        for i in range(min(self.num_ports, 4)):
+            if ( self.port_types[i] & 0x80 ):
+                universes.append((self.net << 8) | (self.subnet << 4) | (self.sw_out[i] & 0x0F))
+        return universes
+
+    def outputsUniverse(self, port_address):
+        return port_address in self.outputUniverses()
+
+#########################################
+#
+#   opcode
+#      returns the opcode of an Art-Net packet or None
+#
+#########################################
+def opcode(data):
+    if ( len(data) < ARTNET_HEADER.size ):
+        return None
+    id, op = ARTNET_HEADER.unpack_from(data)
+    if ( id != ARTNET_ID ):
+        return None
+    return op
+
+#########################################
+#
+#   decodePollReply
+#      returns ArtPollReply, short packets from older nodes are zero filled
+#
+#########################################
+def decodePollReply(data):
+    refresh_rate = 0
+    if ( len(data) >= ARTPOLLREPLY_REFRESH_OFFSET + ARTPOLLREPLY_REFRESH.size ):
+        refresh_rate = ARTPOLLREPLY_REFRESH.unpack_from(data, ARTPOLLREPLY_REFRESH_OFFSET)[0]
+    if ( len(data) < ARTPOLLREPLY.size ):
+        data = bytes(data) + bytes(ARTPOLLREPLY.size - len(data))
+    f = ARTPOLLREPLY.unpack_from(data)
+    return ArtPollReply(f[2], f[3], (f[4] << 8) | f[5], f[6] & 0x7F, f[7] & 0x0F,
+                        (f[8] << 8) | f[9], f[10], f[11], f[12], f[13], f[14], f[15],
+                        (f[16] << 8) | f[17], f[18], f[19], f[20], f[21], f[22],
+                        f[23], f[24], f[25], f[26], f[27], f[28], f[29], f[30], refresh_rate)
+
+#########################################
+#
+#   encodePollReply
+#      returns ArtPollReply packet for a node with up to 4 output ports
+#      universes-> list of 15 bit port addresses sharing the same net and subnet
+#      refresh_rate-> maximum ArtDMX packets per second, 0 if not reported
+#      raises ValueError if the universes do not share net and subnet
+#
+#########################################
+def encodePollReply(ip, universes, short_name, long_name, node_report="", mac=bytes(6), bind_index=1,
+                    refresh_rate=0):
+    if ( len(universes) == 0 or len(universes) > 4 ):
+        raise ValueError("a node outputs 1 to 4 universes")
+    high = universes[0] & 0x7FF0
+    if ( any((u & 0x7FF0) != high for u in universes) ):
+        raise ValueError("universes of a node must share net and subnet")
+    n = len(universes)
+    port_types = bytes([0x80] * n + [0] * (4 - n))
+    sw_out = bytes([u & 0x0F for u in universes] + [0] * (4 - n))
+    packet = bytearray(ARTPOLLREPLY_LENGTH)
+    ARTPOLLREPLY.pack_into(packet, 0, ARTNET_ID, OP_POLL_REPLY,
+                           bytes(int(x) for x in ip.split(".")), 0x1936,
+                           0, 1, high >> 8, (high >> 4) & 0x0F, 0, 0xFF, 0,
+                           0xD0, 0,
+                           short_name.encode("utf-8")[:17], long_name.encode("utf-8")[:63],
+                           node_report.encode("utf-8")[:63],
+                           0, n, port_types, bytes(4), bytes([0x80] * n + [0] * (4 - n)),
+                           bytes(4), sw_out,
+                           0, 0, 0, 0,
+                           mac, bytes(4), bind_index, 0x08)
+    ARTPOLLREPLY_REFRESH.pack_into(packet, ARTPOLLREPLY_REFRESH_OFFSET, refresh_rate)
+    return packet
+
+#########################################
+#
+#   decodeDMXHeader
+#      returns (sequence, port address, slot count)
+#
+#########################################
+def decodeDMXHeader(data):
+    f = ARTDMX_HEADER.unpack_from(data)
+    return (f[4], f[6] | ((f[7] & 0x7F) << 8), (f[8] << 8) | f[9])
+
+def cString(b):
+    return bytes(b).split(b"\x00", 1)[0].decode("utf-8", "replace")
@@ -0,0 +1,328 @@
+#   ArtNetSimulator.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+#   Art-Net(TM) Designed by and Copyright Artistic Licence Holdings Ltd.
+
+#################################################################
+#
+#   This file contains a simulator of many Art-Net nodes for load testing
+#   discovery and output without hardware
+#
+#   each simulated node has its own socket bound to its own address
+#   (on Linux every 127.x.x.x address is local, elsewhere add aliases
+#   or dummy interface addresses).  Polls sent to poll_address are
+#   answered by every online node after a random latency.
+#   ArtDMX sent to a node is counted with sequence gaps.
+#
+#   churn takes a fraction of nodes offline (or back online) every
+#   churn interval so that node expiry and rediscovery can be tested
+#
+#   run web2dmx with poll_address=127.255.255.255 and
+#      python3 ArtNetSimulator.py -n 500 -u 0
+#
+#################################################################
+
+import argparse
+import heapq
+import ipaddress
+import random
+import selectors
+import socket
+import threading
+import time
+import ArtNetCodec
+
+ARTNET_PORT = 0x1936
+
+##################################################################################
+#                               SimulatedNode
+#
+#           one node's socket, poll reply and receive counts
+#
+##################################################################################
+
+class SimulatedNode(object):
+
+    def __init__(self, address, universes, index, refresh_rate=0):
+        self.address = address
+        self.universes = universes
+        self.reply = ArtNetCodec.encodePollReply(address, universes,
+                                                 "Sim %d" % index, "ArtNetSimulator node %d" % index,
+                                                 mac=bytes([0x02, 0, 0, 0, index >> 8 & 0xFF, index & 0xFF]),
+                                                 refresh_rate=refresh_rate)
+        self.online = True
+        self.polls = 0
+        self.replies = 0
+        self.frames = 0
+        self.frames_offline = 0
+        self.sequence_gaps = 0
+        self.sequences = {}         # universe -> last sequence
+        self.udpsocket = openSocket(address)
+
+#########################################
+#
+#   dmxReceived counts an ArtDMX packet
+#
+#########################################
+    def dmxReceived(self, data):
+        if ( len(data) < ArtNetCodec.ARTDMX_HEADER.size ):
+            return
+        sequence, universe, count = ArtNetCodec.decodeDMXHeader(data)
+        if ( not self.online ):
+            self.frames_offline += 1
+            return
+        self.frames += 1
+        if ( sequence != 0 ):
+            last = self.sequences.get(universe)
+            if ( last != None and sequence != (last + 1) % 256 ):
+                self.sequence_gaps += 1
+            self.sequences[universe] = sequence
+
+    def close(self):
+        self.udpsocket.close()
+
+##################################################################################
+#                               ArtNetSimulator
+#
+#           nodes sharing one receive thread
+#
+##################################################################################
+
+class ArtNetSimulator(object):
+
+#########################################
+#
+#   init
+#      first_address-> address of the first node, others follow it
+#      count-> number of nodes
+#      universes-> list of 15 bit port addresses
+#      spread-> if True each node outputs one of universes in turn
+#         otherwise every node outputs all of them (up to 4)
+#      poll_address-> broadcast address where polls are received
+#      latency-> (min, max) seconds before a node replies to a poll
+#      churn-> fraction of nodes that change online state each churn_interval
+#      refresh_rate-> ArtDMX packets per second reported in poll replies, 0 for none
+#
+#########################################
+    def __init__(self, first_address, count, universes, spread=False,
+                 poll_address="127.255.255.255", latency=(0.0, 0.0), churn=0.0, churn_interval=10.0,
+                 refresh_rate=0):
+        self.latency = latency
+        self.churn = churn
+        self.churn_interval = churn_interval
+        self.nodes = []
+        first = ipaddress.IPv4Address(first_address)
+        for i in range(count):
+            if ( spread ):
+                node_universes = [universes[i % len(universes)]]
+            else:
+                node_universes = universes
+            self.nodes.append(SimulatedNode(str(first + i), node_universes, i + 1, refresh_rate))
+        self.poll_socket = openSocket(poll_address)
+        self.replies_due = []       # heap of (time, count, node, destination)
+        self.reply_count = 0
+        self.polls = 0
+        self.started = time.monotonic()
+        self.selector = None
+        self.sim_thread = None
+        self.running = False
+
+#########################################
+#
+#   start creates the receive thread
+#   stop ends it and closes the sockets
+#
+#########################################
+    def start(self):
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.poll_socket, selectors.EVENT_READ, None)
+        for n in self.nodes:
+            self.selector.register(n.udpsocket, selectors.EVENT_READ, n)
+        self.running = True
+        self.sim_thread = threading.Thread(target=self.run)
+        self.sim_thread.daemon = True
+        self.sim_thread.start()
+
+    def stop(self):
+        self.running = False
+        if ( self.sim_thread != None ):
+            self.sim_thread.join()
+        self.sim_thread = None
+        self.selector.close()
+        self.poll_socket.close()
+        for n in self.nodes:
+            n.close()
+
+#########################################
+#
+#   run
+#      method to be attached to a thread (don't call directly)
+#      receives polls and ArtDMX, sends replies when due, applies churn
+#
+#########################################
+    def run(self):
+        next_churn = time.monotonic() + self.churn_interval
+        while self.running:
+            now = time.monotonic()
+            timeout = 0.25
+            if ( len(self.replies_due) > 0 ):
+                timeout = max(0, min(timeout, self.replies_due[0][0] - now))
+            for key, mask in self.selector.select(timeout):
+                try:
+                    data, addr = key.fileobj.recvfrom(1024)
+                except OSError:
+                    continue
+                self.packetReceived(key.data, data, addr)
+            now = time.monotonic()
+            self.sendRepliesDue(now)
+            if ( self.churn > 0 and now >= next_churn ):
+                self.churnNodes()
+                next_churn = now + self.churn_interval
+
+#########################################
+#
+#   packetReceived
+#      node-> node whose socket received data or None for a broadcast poll
+#
+#########################################
+    def packetReceived(self, node, data, addr):
+        op = ArtNetCodec.opcode(data)
+        if ( op == ArtNetCodec.OP_DMX and node != None ):
+            node.dmxReceived(data)
+        elif ( op == ArtNetCodec.OP_POLL ):
+            self.polls += 1
+            if ( node == None ):
+                for n in self.nodes:
+                    self.pollReceived(n, addr)
+            else:
+                self.pollReceived(node, addr)
+
+    def pollReceived(self, node, addr):
+        node.polls += 1
+        if ( node.online ):
+            due = time.monotonic() + random.uniform(self.latency[0], self.latency[1])
+            self.reply_count += 1
+            heapq.heappush(self.replies_due, (due, self.reply_count, node, addr))
+
+    def sendRepliesDue(self, now):
+        while ( len(self.replies_due) > 0 and self.replies_due[0][0] <= now ):
+            due, count, node, addr = heapq.heappop(self.replies_due)
+            if ( node.online ):
+                try:
+                    node.udpsocket.sendto(node.reply, addr)
+                    node.replies += 1
+                except OSError as e:
+                    print("reply from ", node.address, " failed: ", e)
+
+    def churnNodes(self):
+        changing = random.sample(self.nodes, max(1, int(len(self.nodes) * self.churn)))
+        for n in changing:
+            n.online = not n.online
+        print("churn: %d nodes changed, %d online" % (len(changing), self.onlineCount()))
+
+    def onlineCount(self):
+        return sum(1 for n in self.nodes if n.online)
+
+#########################################
+#
+#   report
+#      returns dictionary of totals across nodes
+#      frame rate per node is measured since the previous report
+#
+#########################################
+    def report(self, previous=None):
+        now = time.monotonic()
+        frames = [n.frames for n in self.nodes]
+        result = {"time": now,
+                  "nodes": len(self.nodes),
+                  "online": self.onlineCount(),
+                  "polls": self.polls,
+                  "replies": sum(n.replies for n in self.nodes),
+                  "receiving": sum(1 for f in frames if f > 0),
+                  "frames": frames,
+                  "frames_offline": sum(n.frames_offline for n in self.nodes),
+                  "sequence_gaps": sum(n.sequence_gaps for n in self.nodes)}
+        if ( previous != None and now > previous["time"] ):
+            elapsed = now - previous["time"]
+            rates = [(f - p) / elapsed for f, p in zip(frames, previous["frames"])]
+            result["rate_min"] = min(rates)
+            result["rate_max"] = max(rates)
+            result["rate_total"] = sum(rates)
+        return result
+
+    def printReport(self, previous=None):
+        r = self.report(previous)
+        line = "%6.1fs online %d/%d polls %d replies %d receiving %d sequence gaps %d offline frames %d" % (
+            r["time"] - self.started, r["online"], r["nodes"], r["polls"], r["replies"],
+            r["receiving"], r["sequence_gaps"], r["frames_offline"])
+        if ( "rate_total" in r ):
+            line += " frames/s %.1f (node min %.1f max %.1f)" % (r["rate_total"], r["rate_min"], r["rate_max"])
+        print(line)
+        return r
+
+#########################################
+#
+#   openSocket
+#      UDP socket bound to address and the Art-Net port
+#      shares the port with a controller bound to any address
+#
+#########################################
+def openSocket(address):
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    s.bind((address, ARTNET_PORT))
+    s.setblocking(False)
+    return s
+
+#########################################
+#
+#   parseUniverses
+#      "0,1,4-7" -> [0, 1, 4, 5, 6, 7]
+#
+#########################################
+def parseUniverses(text):
+    universes = []
+    for part in text.split(","):
+        r = part.split("-")
+        if ( len(r) == 2 ):
+            universes.extend(range(int(r[0]), int(r[1]) + 1))
+        else:
+            universes.append(int(r[0]))
+    return universes
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Simulate Art-Net nodes")
+    parser.add_argument("-n", "--nodes", type=int, default=100, help="number of nodes")
+    parser.add_argument("-a", "--address", default="127.0.1.1", help="address of the first node")
+    parser.add_argument("-u", "--universes", default="0", help="port addresses eg. 0,1,4-7")
+    parser.add_argument("--spread", action="store_true", help="each node outputs one of the universes")
+    parser.add_argument("-p", "--poll-address", default="127.255.255.255", help="broadcast address of polls")
+    parser.add_argument("--latency-ms", default="0", help="poll reply latency eg. 5-50")
+    parser.add_argument("--churn", type=float, default=0.0, help="fraction of nodes changing state")
+    parser.add_argument("--churn-interval", type=float, default=10.0, help="seconds between churn")
+    parser.add_argument("--refresh-rate", type=int, default=0, help="refresh rate reported by nodes")
+    parser.add_argument("--report-interval", type=float, default=2.0, help="seconds between reports")
+    args = parser.parse_args()
+
+    latency = [float(x) / 1000.0 for x in args.latency_ms.split("-")]
+    simulator = ArtNetSimulator(args.address, args.nodes, parseUniverses(args.universes), args.spread,
+                                args.poll_address, (latency[0], latency[-1]), args.churn, args.churn_interval,
+                                args.refresh_rate)
+    simulator.start()
+    print("simulating %d nodes from %s" % (args.nodes, args.address))
+    previous = None
+    try:
+        while True:
+            time.sleep(args.report_interval)
+            previous = simulator.printReport(previous)
+    except KeyboardInterrupt:
+        pass
+    simulator.stop()
+    simulator.printReport(previous)
@@ -0,0 +1,219 @@
+#   BatchRequest.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+
+#################################################################
+#
+#   This file contains parsing and validation of a batch of level operations
+#
+#   JSON (levels are percent 0-100, times are seconds):
+#      {"token": "name", "priority": 150, "ops": [
+#         {"op": "set", "address": 1, "level": 50},
+#         {"op": "set", "levels": {"1": 50, "2": 60}},
+#         {"op": "range", "start": 1, "end": 24, "level": 50},
+#         {"op": "list", "start": 1, "levels": [10, 20, 30]},
+#         {"op": "fade", "start": 1, "end": 24, "level": 0, "time": 2.5},
+#         {"op": "preset", "name": "warm", "time": 1}]}
+#
+#   binary (big endian, values are DMX 0-255, times are milliseconds):
+#      0x01 set     address(H) value(B)
+#      0x02 range   start(H) end(H) value(B)
+#      0x03 fade    start(H) end(H) value(B) time(I)
+#      0x04 preset  time(I) length(B) name
+#      0x05 list    start(H) count(H) count values(B)
+#
+#   operations are combined in order, a later operation on an address
+#   replaces an earlier one.  The result is a list of sets and a list of fades.
+#
+#################################################################
+
+import json
+import math
+import struct
+import time
+from ArtNet import ArtNetInterface
+
+BATCH_SET = struct.Struct(">HB")
+BATCH_RANGE = struct.Struct(">HHB")
+BATCH_FADE = struct.Struct(">HHBI")
+BATCH_PRESET = struct.Struct(">IB")
+BATCH_LIST = struct.Struct(">HH")
+
+##################################################################################
+#                               BatchRequest
+#
+#           validated operations of a batch
+#
+##################################################################################
+
+class BatchRequest(object):
+
+#########################################
+#
+#   init
+#      size-> number of addresses
+#      presets-> dictionary of preset name to list of (address, value 0-255)
+#
+#########################################
+    def __init__(self, size, presets):
+        self.size = size
+        self.presets = presets
+        self.token = None
+        self.priority = None
+        self.ops = []           # (op name, slot count, microseconds)
+        self.slots = {}         # address -> (value, fade time or None)
+
+#########################################
+#
+#   parseJSON
+#      raises ValueError if the batch is not valid
+#
+#########################################
+    def parseJSON(self, body):
+        try:
+            batch = json.loads(body)
+            self.token = batch.get("token")
+            if ( batch.get("priority") != None ):
+                self.priority = int(batch["priority"])
+            for op in batch["ops"]:
+                t0 = time.perf_counter()
+                name = op["op"]
+                fade = None
+                if ( name == "set" ):
+                    if ( "levels" in op ):
+                        pairs = [(int(a), self.value(v)) for a, v in op["levels"].items()]
+                    else:
+                        pairs = [(int(op["address"]), self.value(op["level"]))]
+                elif ( name == "range" or name == "fade" ):
+                    start = int(op.get("start", op.get("address", 0)))
+                    end = int(op.get("end", start))
+                    v = self.value(op["level"])
+                    self.checkRange(name, start, end)
+                    pairs = [(a, v) for a in range(start, end + 1)]
+                    if ( name == "fade" ):
+                        fade = float(op["time"])
+                elif ( name == "list" ):
+                    start = int(op["start"])
+                    if ( len(op["levels"]) > 0 ):
+                        self.checkRange(name, start, start + len(op["levels"]) - 1)
+                    pairs = [(start + i, self.value(v)) for i, v in enumerate(op["levels"])]
+                elif ( name == "preset" ):
+                    pairs = self.preset(op["name"])
+                    fade = float(op.get("time", 0))
+                else:
+                    raise ValueError("unknown operation %s" % name)
+                self.addOperation(name, pairs, fade, t0)
+        except (KeyError, TypeError, AttributeError, OverflowError) as e:
+            raise ValueError("invalid batch: %s" % e)
+
+    def value(self, level):
+        if ( not math.isfinite(float(level)) ):
+            raise ValueError("level %s is not a number" % level)
+        return ArtNetInterface.level2dmx(level)
+
+#########################################
+#
+#   parseBinary
+#      raises ValueError if the batch is not valid
+#
+#########################################
+    def parseBinary(self, body):
+        data = memoryview(body)
+        offset = 0
+        try:
+            while ( offset < len(data) ):
+                t0 = time.perf_counter()
+                code = data[offset]
+                offset += 1
+                fade = None
+                if ( code == 0x01 ):
+                    a, v = BATCH_SET.unpack_from(data, offset)
+                    offset += BATCH_SET.size
+                    name = "set"
+                    pairs = [(a, v)]
+                elif ( code == 0x02 or code == 0x03 ):
+                    if ( code == 0x02 ):
+                        start, end, v = BATCH_RANGE.unpack_from(data, offset)
+                        offset += BATCH_RANGE.size
+                        name = "range"
+                    else:
+                        start, end, v, ms = BATCH_FADE.unpack_from(data, offset)
+                        offset += BATCH_FADE.size
+                        name = "fade"
+                        fade = ms / 1000.0
+                    self.checkRange(name, start, end)
+                    pairs = [(a, v) for a in range(start, end + 1)]
+                elif ( code == 0x04 ):
+                    ms, n = BATCH_PRESET.unpack_from(data, offset)
+                    offset += BATCH_PRESET.size
+                    if ( offset + n > len(data) ):
+                        raise ValueError("truncated preset name")
+                    name = "preset"
+                    pairs = self.preset(bytes(data[offset:offset+n]).decode("utf-8"))
+                    offset += n
+                    fade = ms / 1000.0
+                elif ( code == 0x05 ):
+                    start, n = BATCH_LIST.unpack_from(data, offset)
+                    offset += BATCH_LIST.size
+                    if ( offset + n > len(data) ):
+                        raise ValueError("truncated list")
+                    name = "list"
+                    if ( n > 0 ):
+                        self.checkRange(name, start, start + n - 1)
+                    pairs = [(start + i, v) for i, v in enumerate(data[offset:offset+n])]
+                    offset += n
+                else:
+                    raise ValueError("unknown operation code %d" % code)
+                self.addOperation(name, pairs, fade, t0)
+        except struct.error as e:
+            raise ValueError("truncated batch: %s" % e)
+
+    def preset(self, name):
+        if ( name not in self.presets ):
+            raise ValueError("unknown preset %s" % name)
+        return self.presets[name]
+
+#########################################
+#
+#   checkRange
+#      raises ValueError unless addresses start to end are within size
+#      so that a range is checked before it is expanded
+#
+#########################################
+    def checkRange(self, name, start, end):
+        if ( start < 1 or end < start or end > self.size ):
+            raise ValueError("%s addresses %s to %s are out of range" % (name, start, end))
+
+#########################################
+#
+#   addOperation
+#      validates pairs and records them with the operation's timing
+#
+#########################################
+    def addOperation(self, name, pairs, fade, t0):
+        if ( fade != None and ( not math.isfinite(fade) or fade < 0 ) ):
+            raise ValueError("%s time %s is not a positive number" % (name, fade))
+        if ( fade == 0 ):
+            fade = None
+        for a, v in pairs:
+            if ( a < 1 or a > self.size or v < 0 or v > 255 ):
+                raise ValueError("%s address %s at %s is out of range" % (name, a, v))
+            self.slots[a] = (v, fade)
+        self.ops.append((name, len(pairs), int((time.perf_counter() - t0) * 1000000)))
+
+#########################################
+#
+#   sets returns list of (address, value)
+#   fades returns list of (address, value, seconds)
+#
+#########################################
+    def sets(self):
+        return [(a, v) for a, (v, f) in self.slots.items() if f == None]
+
+    def fades(self):
+        return [(a, v, f) for a, (v, f) in self.slots.items() if f != None]
@@ -11,6 +11,21 @@
 
 import socket
 import ipaddress
+import struct
+import sys
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SIOCGIFADDR = 0x8915
+SIOCGIFNETMASK = 0x891b
 
 
 ##################################################################################
@@ -22,6 +37,10 @@ import ipaddress
 
 class CTNetUtil(object):
 
+    interface_cache = None
+    broadcast_cache = {}
+    broadcast_cache_limit = 256
+
 #########################################
 #
 #   get_ip_address
@@ -62,15 +81,35 @@ class CTNetUtil(object):
 #########################################
 #
 #   findBroadcastAddress
-#   returns third command line argument
-#   OR, value from properties file
-#       if "auto" returns broadcast address based on
-#       the network portion of available interface address (belonging to internet family)
-#       as determined by that address's class
+#   returns the broadcast address of the local interface whose network
+#       contains ipaddress, using the interface's netmask
+#   OR, if no interface matches, a broadcast address based on
+#       the network portion of ipaddress as determined by that address's class
+#   results are cached, the oldest is removed when there are more than
+#       broadcast_cache_limit so that polls from many senders cannot grow it
 #
 #######################################
 
     def findBroadcastAddress(ipaddress):
+        bcast = CTNetUtil.broadcast_cache.get(ipaddress)
+        if ( bcast == None ):
+            iface = CTNetUtil.interfaceForAddress(ipaddress)
+            if ( iface != None ):
+                bcast = iface[3]
+            else:
+                bcast = CTNetUtil.classfulBroadcastAddress(ipaddress)
+            if ( len(CTNetUtil.broadcast_cache) >= CTNetUtil.broadcast_cache_limit ):
+                del CTNetUtil.broadcast_cache[next(iter(CTNetUtil.broadcast_cache))]
+            CTNetUtil.broadcast_cache[ipaddress] = bcast
+        return bcast
+
+#########################################
+#
+#   classfulBroadcastAddress
+#   returns broadcast address based on the class of ipaddress
+#
+#######################################
+    def classfulBroadcastAddress(ipaddress):
         octets = ipaddress.split(".")
         ipclass = CTNetUtil.getClassOfIPAddress(int(octets[0]))
         if ( ipclass == 1 ):
@@ -80,4 +119,93 @@ class CTNetUtil(object):
         if ( ipclass == 3 ):
             return octets[0] + "." + octets[1] + "." + octets[2] + ".255"
             #default to broadcast to all networks
-        return "255.255.255.255"
\ No newline at end of file
+        return "255.255.255.255"
+
+#########################################
+#
+#   getInterfaces
+#   returns list of (name, ip address, netmask, broadcast address)
+#       for each IPv4 interface
+#   uses psutil if it is installed, otherwise ioctl on Linux
+#   falls back to get_ip_address with a class based netmask
+#   the list is cached, pass refresh=True to enumerate again
+#
+#######################################
+    def getInterfaces(refresh=False):
+        if ( CTNetUtil.interface_cache != None and not refresh ):
+            return CTNetUtil.interface_cache
+        interfaces = []
+        try:
+            if ( psutil != None ):
+                interfaces = CTNetUtil.psutilInterfaces()
+            elif ( fcntl != None and sys.platform.startswith("linux") ):
+                interfaces = CTNetUtil.ioctlInterfaces()
+        except Exception as e:
+            print ( "getInterfaces error: ", e )
+        if ( len(interfaces) == 0 ):
+            addr = CTNetUtil.get_ip_address()
+            net = ipaddress.IPv4Network("%s/%d" % (addr, CTNetUtil.classfulPrefix(addr)), strict=False)
+            interfaces.append(CTNetUtil.interfaceEntry("default", addr, str(net.netmask)))
+        CTNetUtil.interface_cache = interfaces
+        CTNetUtil.broadcast_cache = {}
+        return interfaces
+
+    def psutilInterfaces():
+        interfaces = []
+        for name, addrs in psutil.net_if_addrs().items():
+            for a in addrs:
+                if ( a.family == socket.AF_INET and a.netmask != None ):
+                    interfaces.append(CTNetUtil.interfaceEntry(name, a.address, a.netmask))
+        return interfaces
+
+    def ioctlInterfaces():
+        interfaces = []
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            for index, name in socket.if_nameindex():
+                req = struct.pack("256s", bytes(name[:15], "utf-8"))
+                try:
+                    addr = socket.inet_ntoa(fcntl.ioctl(s.fileno(), SIOCGIFADDR, req)[20:24])
+                    mask = socket.inet_ntoa(fcntl.ioctl(s.fileno(), SIOCGIFNETMASK, req)[20:24])
+                except OSError:
+                    continue            # no IPv4 address
+                interfaces.append(CTNetUtil.interfaceEntry(name, addr, mask))
+        finally:
+            s.close()
+        return interfaces
+
+    def interfaceEntry(name, addr, mask):
+        net = ipaddress.IPv4Network(addr + "/" + mask, strict=False)
+        return (name, addr, mask, str(net.broadcast_address))
+
+    def classfulPrefix(addr):
+        return (0, 8, 16, 24)[CTNetUtil.getClassOfIPAddress(int(addr.split(".")[0]))]
+
+#########################################
+#
+#   interfaceForAddress
+#   returns the interface entry whose address is ipaddress
+#       or whose network contains ipaddress, or None
+#
+#   interfaceNamed returns interface entry with name or address n
+#
+#######################################
+    def interfaceForAddress(ipaddr):
+        try:
+            ip = ipaddress.IPv4Address(ipaddr)
+        except ValueError:
+            return None
+        match = None
+        for iface in CTNetUtil.getInterfaces():
+            if ( iface[1] == ipaddr ):
+                return iface
+            net = ipaddress.IPv4Network(iface[1] + "/" + iface[2], strict=False)
+            if ( ip in net and not ip.is_loopback and match == None ):
+                match = iface
+        return match
+
+    def interfaceNamed(n):
+        for iface in CTNetUtil.getInterfaces():
+            if ( iface[0] == n or iface[1] == n ):
+                return iface
+        return None
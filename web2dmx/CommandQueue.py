@@ -0,0 +1,238 @@
+#   CommandQueue.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+
+#################################################################
+#
+#   This file contains a bounded queue of level commands
+#   between HTTP request threads and a single frame builder thread
+#
+#   request threads submit commands which are held until the next frame
+#   writes to the same layer and address within a frame are collapsed
+#   into the last value.  The frame builder applies everything pending
+#   to the LevelLayers and sends one frame.
+#
+#   when more than limit slot writes are pending, accepting() returns False
+#   so requests can be refused until the frame builder catches up
+#
+#   a batch submits sets and fades together so that they are all applied
+#   in the same frame.  While fades are active a frame is built every interval.
+#
+#################################################################
+
+import threading
+import time
+from FadeEngine import FadeEngine
+
+##################################################################################
+#                               CommandQueue
+#
+#           coalescing command queue and frame builder thread
+#
+##################################################################################
+
+class CommandQueue(object):
+
+    def __init__(self, layers, interface, frame_rate=44, limit=4096):
+        self.layers = layers
+        self.interface = interface
+        self.interval = 1.0 / frame_rate
+        self.limit = limit
+        self.condition = threading.Condition()
+        self.pending = {}               # (layer, address) -> value
+        self.pending_fades = {}         # (layer, address) -> (value, duration)
+        self.layer_ops = []             # (method, layer, argument)
+        self.fades = FadeEngine()
+        self.submitted = 0
+        self.applied = 0
+        self.applied_generation = 0
+        self.build_thread = None
+        self.building = False
+
+#########################################
+#
+#   accepting returns False if the queue is full
+#
+#########################################
+    def accepting(self):
+        return len(self.pending) < self.limit
+
+#########################################
+#
+#   submit
+#      layer-> key of layer
+#      pairs-> list of (address, value 0-255)
+#      raises ValueError if a pair is out of range
+#      returns the sequence number of the submission
+#
+#########################################
+    def submit(self, layer, pairs):
+        self.layers.checkValues(pairs)
+        with self.condition:
+            for a, v in pairs:
+                self.pending[(layer, a)] = v
+                self.pending_fades.pop((layer, a), None)
+            return self.notifyBuilder()
+
+#########################################
+#
+#   submitBatch
+#      sets-> list of (address, value 0-255) applied first
+#      fades-> list of (address, value 0-255, duration seconds)
+#         which start from the value each address has after sets
+#      all are applied in the same frame
+#      returns the sequence number of the submission
+#
+#########################################
+    def submitBatch(self, layer, sets, fades):
+        self.layers.checkValues(sets)
+        self.layers.checkValues([(a, v) for a, v, d in fades])
+        with self.condition:
+            for a, v in sets:
+                self.pending[(layer, a)] = v
+                self.pending_fades.pop((layer, a), None)
+            for a, v, d in fades:
+                self.pending_fades[(layer, a)] = (v, d)
+            return self.notifyBuilder()
+
+#########################################
+#
+#   submitPriority and submitRelease queue layer changes
+#      a release discards values pending for the layer
+#
+#########################################
+    def submitPriority(self, layer, priority):
+        with self.condition:
+            self.layer_ops.append((self.layers.setPriority, layer, priority))
+            return self.notifyBuilder()
+
+    def submitRelease(self, layer):
+        with self.condition:
+            for k in [k for k in self.pending if k[0] == layer]:
+                del self.pending[k]
+            for k in [k for k in self.pending_fades if k[0] == layer]:
+                del self.pending_fades[k]
+            self.layer_ops.append((self.releaseLayer, layer, None))
+            return self.notifyBuilder()
+
+    def notifyBuilder(self):
+        self.submitted += 1
+        self.condition.notify_all()
+        return self.submitted
+
+#########################################
+#
+#   waitApplied
+#      waits until submission seq has been sent (or timeout seconds)
+#      returns True if it was sent
+#
+#########################################
+    def waitApplied(self, seq, timeout=1.0):
+        end = time.monotonic() + timeout
+        with self.condition:
+            while ( self.applied < seq ):
+                remaining = end - time.monotonic()
+                if ( remaining <= 0 ):
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+#########################################
+#
+#   startBuilding creates the frame builder thread
+#   stopBuilding ends it
+#
+#########################################
+    def startBuilding(self):
+        self.building = True
+        if ( self.build_thread is None ):
+            self.build_thread = threading.Thread(target=self.build)
+            self.build_thread.daemon = True
+            self.build_thread.start()
+
+    def stopBuilding(self):
+        with self.condition:
+            self.building = False
+            self.condition.notify_all()
+        if ( self.build_thread != None ):
+            self.build_thread.join()
+        self.build_thread = None
+
+#########################################
+#
+#   build
+#      method to be attached to a thread (don't call directly)
+#      applies pending commands and sends at most one frame per interval
+#
+#########################################
+    def build(self):
+        while self.building:
+            with self.condition:
+                while ( self.building and self.submitted == self.applied and not self.fades.active() ):
+                    self.condition.wait()
+                pending = self.pending
+                pending_fades = self.pending_fades
+                layer_ops = self.layer_ops
+                seq = self.submitted
+                self.pending = {}
+                self.pending_fades = {}
+                self.layer_ops = []
+            frame_start = time.monotonic()
+            self.applyCommands(pending, pending_fades, layer_ops, frame_start)
+            with self.condition:
+                self.applied = seq
+                self.applied_generation = self.interface.generation
+                self.condition.notify_all()
+            wait = frame_start + self.interval - time.monotonic()
+            if ( wait > 0 ):
+                time.sleep(wait)
+
+#########################################
+#
+#   applyCommands
+#      resolves layer changes, sets, new fades and fade steps
+#      into one list of slots written to the interface at once
+#      then sends the frame
+#      a command that fails is skipped so the rest of the frame is still sent
+#
+#########################################
+    def applyCommands(self, pending, pending_fades, layer_ops, now):
+        try:
+            slots = []
+            for method, layer, arg in layer_ops:
+                if ( arg == None ):
+                    self.applyCommand(method, layer, slots)
+                else:
+                    self.applyCommand(method, layer, arg, slots)
+            by_layer = {}
+            for (layer, a), v in pending.items():
+                by_layer.setdefault(layer, []).append((a, v))
+            for layer, pairs in by_layer.items():
+                self.fades.cancel(layer, [a for a, v in pairs])
+                self.applyCommand(self.layers.setValues, layer, pairs, slots)
+            for (layer, a), (v, d) in pending_fades.items():
+                self.applyCommand(self.startFade, layer, a, v, d, now)
+            for layer, pairs in self.fades.tick(now).items():
+                self.applyCommand(self.layers.setValues, layer, pairs, slots)
+            self.interface.setDMXSlots(slots)
+            self.interface.sendDMXNow()
+        except Exception as e:
+            print ("Frame builder error: ", e)
+
+    def applyCommand(self, method, *args):
+        try:
+            method(*args)
+        except Exception as e:
+            print ("Frame builder error: ", e)
+
+    def startFade(self, layer, address, value, duration, now):
+        self.fades.startFade(layer, [(address, self.layers.currentValue(layer, address), value)], duration, now)
+
+    def releaseLayer(self, layer, slots):
+        self.fades.cancelLayer(layer)
+        self.layers.release(layer, slots)
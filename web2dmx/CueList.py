@@ -0,0 +1,346 @@
+#   CueList.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+
+#################################################################
+#
+#   This file contains a cue list played by a timeline scheduler
+#
+#   a cue sets levels in a fade time.  Its wait delays the start of the cue
+#   after GO and its follow starts the next cue that long after it starts.
+#   triggers GO a cue at a time of day, optionally on certain days.
+#
+#   cue file (JSON, levels are percent 0-100, times are seconds):
+#      {"loop": true,
+#       "cues": [
+#         {"number": 1, "name": "dawn", "levels": {"1": 50, "2": 60}, "fade": 5, "follow": 600},
+#         {"number": 2, "preset": "warm", "fade": 3, "wait": 1}],
+#       "triggers": [
+#         {"time": "07:30", "cue": 1},
+#         {"time": "22:00:30", "cue": 2, "days": ["sat", "sun"]}]}
+#
+#   events are kept in a heap ordered by the event loop's monotonic clock
+#   one loop timer is armed for the earliest event
+#   all scheduling is done on the interface's event loop thread
+#
+#################################################################
+
+import datetime
+import heapq
+import json
+import math
+import time
+from ArtNet import ArtNetInterface
+
+DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+##################################################################################
+#                               CueScheduler
+#
+#           heap of timed events run on a DMXInterface's event loop
+#
+##################################################################################
+
+class CueScheduler(object):
+
+    def __init__(self, interface):
+        self.interface = interface
+        self.events = []            # [time, count, callback, args, active]
+        self.count = 0
+        self.timer = None
+        self.timer_when = None
+
+    def now(self):
+        return self.interface.loop.time()
+
+#########################################
+#
+#   schedule
+#      calls callback(*args) at loop time when
+#      returns event that can be cancelled
+#   cancel marks event so it is discarded when it reaches the top of the heap
+#
+#########################################
+    def schedule(self, when, callback, *args):
+        self.count += 1
+        event = [when, self.count, callback, args, True]
+        heapq.heappush(self.events, event)
+        self.arm()
+        return event
+
+    def cancel(self, event):
+        if ( event != None ):
+            event[4] = False
+
+    def pending(self):
+        return sum(1 for e in self.events if e[4])
+
+#########################################
+#
+#   arm sets the loop timer for the earliest active event
+#   run calls every event that is due then arms the timer again
+#
+#########################################
+    def arm(self):
+        while ( len(self.events) > 0 and not self.events[0][4] ):
+            heapq.heappop(self.events)
+        if ( len(self.events) == 0 ):
+            return
+        when = self.events[0][0]
+        if ( self.timer != None ):
+            if ( self.timer_when <= when ):
+                return
+            self.timer.cancel()
+        self.timer_when = when
+        self.timer = self.interface.loop.call_at(when, self.run)
+
+    def run(self):
+        self.timer = None
+        now = self.now()
+        while ( len(self.events) > 0 and self.events[0][0] <= now ):
+            when, count, callback, args, active = heapq.heappop(self.events)
+            if ( active ):
+                try:
+                    callback(*args)
+                except Exception as e:
+                    print ("Cue error: ", e)
+        self.arm()
+
+    def stop(self):
+        self.events = []
+        if ( self.timer != None ):
+            self.timer.cancel()
+            self.timer = None
+
+##################################################################################
+#                               Cue
+#
+#           levels (address, value 0-255) with timing in seconds
+#
+##################################################################################
+
+class Cue(object):
+
+    def __init__(self, number, name, levels, fade=0, wait=0, follow=None):
+        self.number = number
+        self.key = CueList.cueNumber(number)
+        self.name = name
+        self.levels = levels
+        self.fade = fade
+        self.wait = wait
+        self.follow = follow
+
+##################################################################################
+#                               CueList
+#
+#           ordered cues and time of day triggers
+#
+##################################################################################
+
+class CueList(object):
+
+#########################################
+#
+#   init
+#      owner-> must respond to createBatch and apply_batch
+#      scheduler-> CueScheduler
+#      layer-> key of the layer cues are set in
+#
+#########################################
+    def __init__(self, owner, scheduler, layer="cues"):
+        self.owner = owner
+        self.scheduler = scheduler
+        self.layer = layer
+        self.cues = []
+        self.triggers = []          # (hour, minute, second, days, cue number)
+        self.loop = False
+        self.current = None
+        self.pending = None         # wait or follow event of the running cue
+
+#########################################
+#
+#   start schedules the triggers, call on the event loop
+#
+#########################################
+    def start(self):
+        for trigger in self.triggers:
+            self.scheduleTrigger(trigger)
+
+    def stop(self):
+        self.scheduler.stop()
+
+#########################################
+#
+#   go
+#      starts cue number (or the next cue if number is None)
+#      after its wait, cancels the previous cue's wait or follow
+#      raises ValueError if there is no such cue
+#
+#########################################
+    def go(self, number=None):
+        index = self.indexForNumber(number)
+        self.scheduler.cancel(self.pending)
+        self.pending = None
+        cue = self.cues[index]
+        if ( cue.wait > 0 ):
+            self.pending = self.scheduler.schedule(self.scheduler.now() + cue.wait, self.startCue, index)
+        else:
+            self.startCue(index)
+
+    def indexForNumber(self, number):
+        if ( len(self.cues) == 0 ):
+            raise ValueError("no cues")
+        if ( number == None ):
+            if ( self.current == None ):
+                return 0
+            if ( self.current + 1 < len(self.cues) ):
+                return self.current + 1
+            if ( self.loop ):
+                return 0
+            raise ValueError("end of cue list")
+        key = CueList.cueNumber(number)
+        for i, cue in enumerate(self.cues):
+            if ( cue.key == key ):
+                return i
+        raise ValueError("no cue %s" % number)
+
+#########################################
+#
+#   cueNumber
+#      returns number as a string used to find a cue
+#      so that 1, 1.0 and "1" from a file or a query are the same cue
+#      and numbers like "2a" are compared as text
+#
+#########################################
+    def cueNumber(number):
+        text = str(number).strip()
+        try:
+            f = float(text)
+        except ValueError:
+            return text
+        if ( not math.isfinite(f) ):
+            return text
+        if ( f.is_integer() ):
+            return str(int(f))
+        return repr(f)
+
+    def stopCue(self):
+        self.scheduler.cancel(self.pending)
+        self.pending = None
+
+#########################################
+#
+#   startCue
+#      applies the cue's levels in its fade time and schedules its follow
+#
+#########################################
+    def startCue(self, index):
+        t0 = time.perf_counter()
+        cue = self.cues[index]
+        self.pending = None
+        self.current = index
+        print("Cue %s %s" % (cue.number, cue.name))
+        batch = self.owner.createBatch()
+        batch.addOperation("cue", cue.levels, cue.fade, t0)
+        self.owner.apply_batch(self.layer, batch, False)
+        if ( cue.follow != None ):
+            if ( index + 1 < len(self.cues) or self.loop ):
+                self.pending = self.scheduler.schedule(self.scheduler.now() + cue.follow, self.go, None)
+
+#########################################
+#
+#   scheduleTrigger
+#      schedules trigger's next time of day on the monotonic clock
+#      after-> time of day the trigger last fired, its next time is after this
+#         so a timer that runs slightly early does not fire it twice
+#
+#########################################
+    def scheduleTrigger(self, trigger, after=None):
+        now = datetime.datetime.now()
+        if ( after == None or after < now ):
+            after = now
+        at = CueList.nextOccurrence(trigger, after)
+        delay = (at - now).total_seconds()
+        self.scheduler.schedule(self.scheduler.now() + delay, self.triggerFired, trigger, at)
+
+    def triggerFired(self, trigger, at):
+        try:
+            self.go(trigger[4])
+        finally:
+            self.scheduleTrigger(trigger, at)
+
+    def nextOccurrence(trigger, after):
+        hour, minute, second, days, number = trigger
+        at = after.replace(hour=hour, minute=minute, second=second, microsecond=0)
+        if ( at <= after ):
+            at += datetime.timedelta(days=1)
+        while ( len(days) > 0 and at.weekday() not in days ):
+            at += datetime.timedelta(days=1)
+        return at
+
+#########################################
+#
+#   status returns dictionary for JSON reply
+#
+#########################################
+    def status(self):
+        current = None
+        if ( self.current != None ):
+            cue = self.cues[self.current]
+            current = {"number": cue.number, "name": cue.name}
+        return {"current": current, "cues": len(self.cues),
+                "waiting": self.pending != None, "scheduled": self.scheduler.pending()}
+
+#########################################
+#
+#   loadCueList
+#      reads cues and triggers from JSON file into cue_list
+#      presets-> dictionary of preset name to list of (address, value 0-255)
+#      raises ValueError if the file is not valid
+#
+#########################################
+    def loadCueList(cue_list, path, presets):
+        with open(path, 'r') as f:
+            config = json.load(f)
+        try:
+            cue_list.loop = bool(config.get("loop", False))
+            for c in config["cues"]:
+                levels = []
+                if ( "preset" in c ):
+                    if ( c["preset"] not in presets ):
+                        raise ValueError("unknown preset %s" % c["preset"])
+                    levels.extend(presets[c["preset"]])
+                for a, v in c.get("levels", {}).items():
+                    levels.append((int(a), ArtNetInterface.level2dmx(v)))
+                follow = c.get("follow")
+                if ( follow != None ):
+                    follow = CueList.seconds(follow)
+                cue_list.cues.append(Cue(c["number"], c.get("name", ""), levels,
+                                         CueList.seconds(c.get("fade", 0)), CueList.seconds(c.get("wait", 0)), follow))
+            for t in config.get("triggers", []):
+                hms = [int(x) for x in t["time"].split(":")] + [0, 0]
+                if ( hms[0] < 0 or hms[0] > 23 or hms[1] < 0 or hms[1] > 59 or hms[2] < 0 or hms[2] > 59 ):
+                    raise ValueError("trigger time %s is not a time of day" % t["time"])
+                days = [DAYS.index(d.lower()[:3]) for d in t.get("days", [])]
+                cue_list.indexForNumber(t["cue"])
+                cue_list.triggers.append((hms[0], hms[1], hms[2], days, t["cue"]))
+        except (KeyError, TypeError, IndexError, AttributeError, OverflowError) as e:
+            raise ValueError("invalid cue list: %s" % e)
+
+#########################################
+#
+#   seconds
+#      returns value as float seconds
+#      raises ValueError if it is negative or not a finite number
+#
+#########################################
+    def seconds(value):
+        t = float(value)
+        if ( not math.isfinite(t) or t < 0 ):
+            raise ValueError("time %s is not a positive number" % value)
+        return t
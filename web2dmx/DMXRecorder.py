@@ -0,0 +1,266 @@
+#   DMXRecorder.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+
+#################################################################
+#
+#   This file contains a recorder that logs DMX frames to a compact binary file
+#   and a player that streams a log back through an ArtNetInterface
+#
+#   file format (little endian):
+#      header    "LXDMXREC" version(H)
+#      record    time_ms(I) flags(B) universe(H) run_count(H)
+#      run       start(H) length(H) followed by length bytes of DMX data
+#
+#   records only contain the runs of slots that changed since the previous
+#   frame from the same source and universe.  A keyframe holding the full
+#   frame is written periodically so playback can seek.
+#
+#################################################################
+
+import struct
+import threading
+import time
+import bisect
+
+REC_MAGIC = b"LXDMXREC"
+REC_VERSION = 1
+REC_HEADER = struct.Struct("<8sH")
+REC_RECORD = struct.Struct("<IBHH")
+REC_RUN = struct.Struct("<HH")
+
+REC_FLAG_INPUT = 0x01
+REC_FLAG_KEYFRAME = 0x02
+
+##################################################################################
+#                               DMXRecorder
+#
+#           writes timestamped, delta encoded frames to a log file
+#
+##################################################################################
+
+class DMXRecorder(object):
+
+    def __init__(self, filename, keyframe_interval=10.0):
+        self.lock = threading.Lock()
+        self.keyframe_interval = keyframe_interval
+        self.previous = {}
+        self.keyframe_times = {}
+        self.start_time = time.monotonic()
+        self.file = open(filename, 'wb')
+        self.file.write(REC_HEADER.pack(REC_MAGIC, REC_VERSION))
+
+#########################################
+#
+#   recordFrame
+#      source_in-> True if frame was received, False if sent
+#      universe-> 15 bit Art-Net port address
+#      data-> DMX slots (up to 512)
+#
+#########################################
+    def recordFrame(self, source_in, universe, data):
+        with self.lock:
+            if ( self.file == None ):
+                return
+            now = time.monotonic()
+            flags = REC_FLAG_INPUT if source_in else 0
+            key = (flags, universe)
+            prev = self.previous.get(key)
+            if ( prev == None or len(prev) != len(data) or
+                    now - self.keyframe_times.get(key, 0.0) >= self.keyframe_interval ):
+                runs = [(0, len(data))]
+                flags |= REC_FLAG_KEYFRAME
+                self.keyframe_times[key] = now
+            elif ( prev == data ):
+                return
+            else:
+                runs = DMXRecorder.changedRuns(prev, data)
+            self.previous[key] = bytes(data)
+            t = int((now - self.start_time) * 1000) & 0xFFFFFFFF
+            self.file.write(REC_RECORD.pack(t, flags, universe, len(runs)))
+            for s, e in runs:
+                self.file.write(REC_RUN.pack(s, e - s))
+                self.file.write(data[s:e])
+
+#########################################
+#
+#   changedRuns
+#      returns list of (start, end) ranges where a and b differ
+#      runs separated by fewer than 4 unchanged slots are merged
+#      because a run header is 4 bytes
+#
+#########################################
+    def changedRuns(a, b):
+        runs = []
+        start = None
+        end = 0
+        for i in range(len(b)):
+            if ( a[i] != b[i] ):
+                if ( start == None ):
+                    start = i
+                elif ( i - end >= REC_RUN.size ):
+                    runs.append((start, end))
+                    start = i
+                end = i + 1
+        if ( start != None ):
+            runs.append((start, end))
+        return runs
+
+#########################################
+#
+#   close
+#
+#########################################
+    def close(self):
+        with self.lock:
+            if ( self.file != None ):
+                self.file.close()
+                self.file = None
+
+##################################################################################
+#                               DMXPlayer
+#
+#           plays a log written by DMXRecorder through an ArtNetInterface
+#           using monotonic clock timing
+#
+##################################################################################
+
+class DMXPlayer(object):
+
+    def __init__(self, interface, filename, universe=None, loop=False):
+        self.interface = interface
+        self.universe = universe
+        self.loop = loop
+        self.play_thread = None
+        self.playing = False
+        self.position = 0.0
+        self.frame = bytearray(512)
+        self.readLog(filename)
+
+#########################################
+#
+#   readLog
+#      reads the log into memory and indexes records and keyframes
+#      only output records for the selected universe are kept
+#
+#########################################
+    def readLog(self, filename):
+        with open(filename, 'rb') as f:
+            self.log = memoryview(f.read())
+        magic, version = REC_HEADER.unpack_from(self.log, 0)
+        if ( magic != REC_MAGIC or version != REC_VERSION ):
+            raise ValueError("%s is not a DMX recording" % filename)
+        self.records = []
+        self.keyframes = []
+        offset = REC_HEADER.size
+        while ( offset + REC_RECORD.size <= len(self.log) ):
+            t, flags, universe, count = REC_RECORD.unpack_from(self.log, offset)
+            record_offset = offset
+            offset += REC_RECORD.size
+            for i in range(count):
+                s, n = REC_RUN.unpack_from(self.log, offset)
+                offset += REC_RUN.size + n
+            if ( offset > len(self.log) ):
+                break           # truncated final record
+            if ( flags & REC_FLAG_INPUT ):
+                continue
+            if ( self.universe == None ):
+                self.universe = universe
+            if ( universe != self.universe ):
+                continue
+            if ( flags & REC_FLAG_KEYFRAME ):
+                self.keyframes.append(len(self.records))
+            self.records.append((t / 1000.0, record_offset))
+        self.times = [r[0] for r in self.records]
+
+    def duration(self):
+        if ( len(self.times) == 0 ):
+            return 0.0
+        return self.times[-1]
+
+#########################################
+#
+#   applyRecord
+#      copies the runs of record at index into self.frame
+#
+#########################################
+    def applyRecord(self, index):
+        offset = self.records[index][1]
+        t, flags, universe, count = REC_RECORD.unpack_from(self.log, offset)
+        offset += REC_RECORD.size
+        for i in range(count):
+            s, n = REC_RUN.unpack_from(self.log, offset)
+            offset += REC_RUN.size
+            self.frame[s:s+n] = self.log[offset:offset+n]
+            offset += n
+
+#########################################
+#
+#   seek
+#      rebuilds the frame at time t (seconds) from the previous keyframe
+#      returns index of the next record to play
+#
+#########################################
+    def seek(self, t):
+        index = bisect.bisect_right(self.times, t)
+        k = bisect.bisect_right(self.keyframes, index - 1) - 1
+        if ( k >= 0 ):
+            for i in range(self.keyframes[k], index):
+                self.applyRecord(i)
+        self.position = t
+        return index
+
+#########################################
+#
+#   startPlaying creates a thread that runs play() from position (seconds)
+#   stopPlaying sets a flag which ends the play loop
+#
+#########################################
+    def startPlaying(self, position=0.0):
+        self.stopPlaying()
+        self.playing = True
+        self.position = position
+        self.play_thread = threading.Thread(target=self.play)
+        self.play_thread.daemon = True
+        self.play_thread.start()
+
+    def stopPlaying(self):
+        self.playing = False
+        if ( self.play_thread != None and self.play_thread != threading.current_thread() ):
+            self.play_thread.join()
+        self.play_thread = None
+
+#########################################
+#
+#   play
+#      method to be attached to a thread (don't call directly)
+#      sends each record at its recorded time relative to the monotonic clock
+#
+#########################################
+    def play(self):
+        while self.playing:
+            index = self.seek(self.position)
+            self.sendFrame()
+            start = time.monotonic() - self.position
+            while self.playing and index < len(self.records):
+                wait = start + self.times[index] - time.monotonic()
+                if ( wait > 0 ):
+                    time.sleep(min(wait, 0.1))
+                    continue
+                self.applyRecord(index)
+                self.position = self.times[index]
+                self.sendFrame()
+                index += 1
+            if ( not self.loop ):
+                break
+            self.position = 0.0
+        self.playing = False
+
+    def sendFrame(self):
+        self.interface.setDMXValues(self.frame)
+        self.interface.sendDMXNow()
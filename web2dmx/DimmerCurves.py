@@ -0,0 +1,189 @@
+#   DimmerCurves.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+
+#################################################################
+#
+#   This file contains per address output curves for DMX levels
+#   each curve is compiled once into a 256 entry lookup table
+#   an entire frame is then translated through the tables in bulk
+#   using bytes.translate on contiguous ranges of addresses
+#
+#################################################################
+
+##################################################################################
+#                               DimmerCurves
+#
+#           maps addresses to named curves and translates output frames
+#
+##################################################################################
+
+class DimmerCurves(object):
+
+    def __init__(self, size=512):
+        self.size = size
+        self.curves = {}
+        self.tables = {}
+        self.default_curve = "linear"
+        self.assigned = [None] * size
+        self.groups = []
+        self.compiled = False
+        self.defineBuiltInCurves()
+
+#########################################
+#
+#   defineBuiltInCurves
+#      curves are lists of (input%, output%) points
+#      linear interpolation is used between points
+#
+#########################################
+    def defineBuiltInCurves(self):
+        self.curves["linear"] = [(0, 0), (100, 100)]
+        self.curves["square"] = [(p, p * p / 100.0) for p in range(0, 101, 5)]
+        self.curves["root"] = [(p, (p / 100.0) ** 0.5 * 100.0) for p in range(0, 101, 5)]
+        self.curves["scurve"] = [(0, 0), (10, 2), (25, 10), (50, 50), (75, 90), (90, 98), (100, 100)]
+
+#########################################
+#
+#   defineCurve
+#      name-> curve name
+#      points-> list of (input%, output%) pairs
+#
+#########################################
+    def defineCurve(self, name, points):
+        pts = sorted((float(i), float(o)) for i, o in points)
+        if ( len(pts) < 2 ):
+            raise ValueError("curve %s needs at least two points" % name)
+        self.curves[name] = pts
+        self.tables.pop(name, None)
+        self.compiled = False
+
+#########################################
+#
+#   setDefaultCurve applies to every address without an assigned curve
+#   assignCurve applies a curve to addresses first through last (1-512)
+#
+#########################################
+    def setDefaultCurve(self, name):
+        self.checkCurve(name)
+        self.default_curve = name
+        self.compiled = False
+
+    def assignCurve(self, name, first, last=None):
+        self.checkCurve(name)
+        if ( last == None ):
+            last = first
+        for a in range(max(first, 1), min(last, self.size) + 1):
+            self.assigned[a-1] = name
+        self.compiled = False
+
+    def checkCurve(self, name):
+        if ( name not in self.curves ):
+            raise ValueError("unknown dimmer curve %s" % name)
+
+#########################################
+#
+#   loadProperties
+#      curve_NAME=0x0_50x20_100x100 defines a custom curve with InxOut percent points
+#      dimmer_curve=NAME sets the default curve
+#      dimmer_curve_NAME=1-24_30 assigns NAME to address ranges separated by underscores
+#
+#########################################
+    def loadProperties(self, properties):
+        for key, value in properties.properties.items():
+            if ( key.startswith("curve_") ):
+                points = []
+                for p in value.split("_"):
+                    iv = p.split("x")
+                    if ( len(iv) == 2 ):
+                        points.append((iv[0], iv[1]))
+                self.defineCurve(key[6:], points)
+        self.setDefaultCurve(properties.stringForKey("dimmer_curve", "linear"))
+        for key, value in properties.properties.items():
+            if ( key.startswith("dimmer_curve_") ):
+                name = key[13:]
+                for r in value.split("_"):
+                    fl = r.split("-")
+                    if ( len(fl) == 2 ):
+                        self.assignCurve(name, int(fl[0]), int(fl[1]))
+                    elif ( len(fl) == 1 and fl[0] != "" ):
+                        self.assignCurve(name, int(fl[0]))
+
+#########################################
+#
+#   tableForCurve
+#      builds 256 entry lookup table, cached by name
+#
+#########################################
+    def tableForCurve(self, name):
+        t = self.tables.get(name)
+        if ( t == None ):
+            pts = self.curves[name]
+            t = bytearray(256)
+            j = 0
+            for i in range(256):
+                x = i / 2.55
+                while ( j < len(pts) - 2 and x > pts[j+1][0] ):
+                    j += 1
+                x0, y0 = pts[j]
+                x1, y1 = pts[j+1]
+                if ( x1 == x0 ):
+                    y = y1
+                else:
+                    y = y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+                t[i] = min(255, max(0, int(round(y * 2.55))))
+            t = bytes(t)
+            self.tables[name] = t
+        return t
+
+#########################################
+#
+#   compile
+#      groups assigned addresses into contiguous ranges per table
+#      ranges using an identity table are dropped
+#
+#########################################
+    def compile(self):
+        identity = bytes(range(256))
+        self.default_table = self.tableForCurve(self.default_curve)
+        if ( self.default_table == identity ):
+            self.default_table = None
+        groups = []
+        start = 0
+        for a in range(1, self.size + 1):
+            if ( a == self.size or self.assigned[a] != self.assigned[start] ):
+                name = self.assigned[start]
+                if ( name != None and name != self.default_curve ):
+                    table = self.tableForCurve(name)
+                    if ( table != identity or self.default_table != None ):
+                        groups.append((start, a, table))
+                start = a
+        self.groups = groups
+        self.compiled = True
+
+    def isLinear(self):
+        if ( not self.compiled ):
+            self.compile()
+        return self.default_table == None and len(self.groups) == 0
+
+#########################################
+#
+#   applyCurves
+#      translates levels into out starting at offset
+#
+#########################################
+    def applyCurves(self, levels, out, offset):
+        if ( not self.compiled ):
+            self.compile()
+        n = len(levels)
+        if ( self.default_table == None ):
+            out[offset:offset+n] = levels
+        else:
+            out[offset:offset+n] = levels.translate(self.default_table)
+        for s, e, table in self.groups:
+            out[offset+s:offset+e] = levels[s:e].translate(table)
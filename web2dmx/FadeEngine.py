@@ -0,0 +1,92 @@
+#   FadeEngine.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+
+#################################################################
+#
+#   This file contains timed fades of layer values
+#
+#   the frame builder calls tick() once per frame while fades are active
+#   tick returns the values each fading layer should have in that frame
+#
+#################################################################
+
+import time
+
+##################################################################################
+#                               FadeEngine
+#
+#           active fades keyed by (layer, address)
+#
+##################################################################################
+
+class FadeEngine(object):
+
+    def __init__(self):
+        self.fades = {}         # (layer, address) -> (start value, end value, start time, duration)
+
+    def active(self):
+        return len(self.fades) > 0
+
+#########################################
+#
+#   startFade
+#      layer-> key of layer
+#      pairs-> list of (address, start value, end value)
+#      duration-> seconds
+#
+#########################################
+    def startFade(self, layer, pairs, duration, now=None):
+        if ( now == None ):
+            now = time.monotonic()
+        for a, start, end in pairs:
+            self.fades[(layer, a)] = (start, end, now, duration)
+
+#########################################
+#
+#   cancel stops fades of layer at addresses
+#   cancelLayer stops all fades of layer
+#
+#########################################
+    def cancel(self, layer, addresses):
+        if ( len(self.fades) > 0 ):
+            for a in addresses:
+                self.fades.pop((layer, a), None)
+
+    def cancelLayer(self, layer):
+        for k in [k for k in self.fades if k[0] == layer]:
+            del self.fades[k]
+
+#########################################
+#
+#   tick
+#      returns dictionary of layer to list of (address, value) at time now
+#      finished fades are removed after their end value is returned
+#      a fade whose value cannot be computed is removed
+#
+#########################################
+    def tick(self, now=None):
+        if ( now == None ):
+            now = time.monotonic()
+        values = {}
+        finished = []
+        for (layer, a), (start, end, t0, duration) in self.fades.items():
+            try:
+                if ( duration <= 0 or now - t0 >= duration ):
+                    v = end
+                    finished.append((layer, a))
+                else:
+                    v = int(round(start + (end - start) * (now - t0) / duration))
+            except (ValueError, OverflowError, TypeError, ZeroDivisionError) as e:
+                print ("Fade error: ", e)
+                finished.append((layer, a))
+                continue
+            values.setdefault(layer, []).append((a, v))
+        for k in finished:
+            del self.fades[k]
+        return values
@@ -0,0 +1,98 @@
+#   LevelEvents.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+
+#################################################################
+#
+#   This file contains a Server-Sent Events client of level changes
+#
+#   a LevelEventClient is added as a frame listener of a DMXInterface
+#   changes from each published frame are queued for the client
+#   queued frames are merged so one event is written for everything pending
+#   if a slow client's queue fills, it is cleared and a snapshot is sent instead
+#
+#   events:
+#      event: snapshot   data: {"generation": g, "levels": [l1, l2, ...]}
+#      event: levels     data: {"generation": g, "levels": [[address, level], ...]}
+#
+#################################################################
+
+import threading
+import json
+from ArtNet import ArtNetInterface
+
+##################################################################################
+#                               LevelEventClient
+#
+#           bounded queue of level changes for one event stream
+#
+##################################################################################
+
+class LevelEventClient(object):
+
+    def __init__(self, interface, max_frames=64):
+        self.interface = interface
+        self.max_frames = max_frames
+        self.condition = threading.Condition()
+        self.pending = []
+        self.resync = True
+        self.generation = 0
+
+#########################################
+#
+#   frameChanged (DMXInterface frame listener method)
+#      queues changes, called with the interface's lock held
+#
+#########################################
+    def frameChanged(self, generation, changes):
+        with self.condition:
+            if ( not self.resync ):
+                if ( len(self.pending) >= self.max_frames ):
+                    self.pending = []
+                    self.resync = True
+                else:
+                    self.pending.append(changes)
+            self.generation = generation
+            self.condition.notify()
+
+#########################################
+#
+#   nextEvent
+#      waits up to timeout seconds for changes
+#      returns bytes of one SSE event or None if nothing changed
+#
+#########################################
+    def nextEvent(self, timeout):
+        with self.condition:
+            if ( not self.resync and len(self.pending) == 0 ):
+                self.condition.wait(timeout)
+            resync = self.resync
+            pending = self.pending
+            generation = self.generation
+            self.resync = False
+            self.pending = []
+        if ( resync ):
+            return self.snapshotEvent()
+        if ( len(pending) == 0 ):
+            return None
+        merged = {}
+        for changes in pending:
+            for a, v in changes:
+                merged[a] = v
+        levels = [[a, ArtNetInterface.dmx2level(v)] for a, v in sorted(merged.items())]
+        return LevelEventClient.formatEvent("levels", {"generation": generation, "levels": levels})
+
+    def snapshotEvent(self):
+        with self.interface.lock:
+            generation = self.interface.generation
+            values = bytes(self.interface.published_levels)
+        levels = [ArtNetInterface.dmx2level(v) for v in values]
+        return LevelEventClient.formatEvent("snapshot", {"generation": generation, "levels": levels})
+
+    def formatEvent(event, data):
+        return bytes("event: %s\ndata: %s\n\n" % (event, json.dumps(data, separators=(",", ":"))), "utf-8")
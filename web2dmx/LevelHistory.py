@@ -0,0 +1,116 @@
+#   LevelHistory.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+
+#################################################################
+#
+#   This file contains a bounded history of output changes
+#   used to send mirrors only the slots changed since a generation
+#
+#   a LevelHistory is added as a frame listener of a DMXInterface
+#   each published frame's changes are kept in a ring of limit records
+#   a client that is older than the ring (or from before a restart)
+#   receives a full snapshot instead of a delta
+#
+#   values are DMX (0-255) before dimmer curves
+#
+#   binary format (big endian):
+#      flags(B) epoch(Q) generation(I) count(I)
+#      flags 1, full snapshot-> count values(B) for addresses 1 to count
+#      flags 0, delta-> count of address(I) value(B)
+#
+#################################################################
+
+import collections
+import struct
+
+STATE_HEADER = struct.Struct(">BQII")
+STATE_CHANGE = struct.Struct(">IB")
+
+##################################################################################
+#                               LevelHistory
+#
+#           ring of recent (generation, changes) records
+#
+##################################################################################
+
+class LevelHistory(object):
+
+    def __init__(self, interface, epoch, limit=1024):
+        self.interface = interface
+        self.epoch = epoch
+        self.records = collections.deque(maxlen=limit)
+        self.first_generation = interface.generation
+
+#########################################
+#
+#   frameChanged (DMXInterface frame listener method)
+#      records changes, called with the interface's lock held
+#
+#########################################
+    def frameChanged(self, generation, changes):
+        if ( len(self.records) == self.records.maxlen ):
+            self.first_generation = self.records[0][0]
+        self.records.append((generation, changes))
+
+#########################################
+#
+#   changesSince
+#      returns (generation, changes) with changes a list of (address, value)
+#         of slots that differ from output at generation since
+#      returns (generation, None) if since is not in the history
+#      and a full snapshot is needed
+#
+#########################################
+    def changesSince(self, since, epoch=None):
+        with self.interface.lock:
+            generation = self.interface.generation
+            if ( since == None or since < self.first_generation or since > generation ):
+                return (generation, None)
+            if ( epoch != None and epoch != self.epoch ):
+                return (generation, None)
+            merged = {}
+            for g, changes in self.records:
+                if ( g > since ):
+                    for a, v in changes:
+                        merged[a] = v
+        return (generation, sorted(merged.items()))
+
+    def snapshot(self):
+        with self.interface.lock:
+            return (self.interface.generation, bytes(self.interface.published_levels))
+
+#########################################
+#
+#   delta
+#      returns dictionary for JSON reply
+#         {"epoch": e, "generation": g, "full": true, "values": [v1, v2, ...]}
+#         {"epoch": e, "generation": g, "full": false, "changes": [[address, value], ...]}
+#   binaryDelta returns the same as bytes
+#
+#########################################
+    def delta(self, since, epoch=None):
+        generation, changes = self.changesSince(since, epoch)
+        if ( changes == None ):
+            generation, values = self.snapshot()
+            return {"epoch": self.epoch, "generation": generation, "full": True, "values": list(values)}
+        return {"epoch": self.epoch, "generation": generation, "full": False,
+                "changes": [[a, v] for a, v in changes]}
+
+    def binaryDelta(self, since, epoch=None):
+        generation, changes = self.changesSince(since, epoch)
+        if ( changes == None ):
+            generation, values = self.snapshot()
+            return STATE_HEADER.pack(1, self.epoch, generation, len(values)) + values
+        data = bytearray(STATE_HEADER.size + STATE_CHANGE.size * len(changes))
+        STATE_HEADER.pack_into(data, 0, 0, self.epoch, generation, len(changes))
+        offset = STATE_HEADER.size
+        for a, v in changes:
+            STATE_CHANGE.pack_into(data, offset, a, v)
+            offset += STATE_CHANGE.size
+        return bytes(data)
@@ -0,0 +1,273 @@
+#   LevelLayers.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+
+#################################################################
+#
+#   This file contains priority layers merged into DMX output
+#
+#   each client (token or ip address) owns a sparse layer of address values
+#   a slot is set by the highest priority layer containing it
+#   layers with equal priority are merged HTP (highest value)
+#   or LTP (latest value)
+#
+#   when a layer changes only the addresses it touched are resolved again
+#
+#   a layer keyed by a client's ip address that is not changed for
+#   idle_timeout seconds is folded into one retained layer of its priority
+#   keeping the values that win, so output does not change and the number
+#   of layers stays bounded by the clients that are active.  A client's
+#   release still removes the values it left in a retained layer.
+#
+#################################################################
+
+import ipaddress
+import threading
+import time
+
+##################################################################################
+#                               LevelLayer
+#
+#           sparse address values belonging to one client
+#
+##################################################################################
+
+class LevelLayer(object):
+
+    def __init__(self, key, priority):
+        self.key = key
+        self.priority = priority
+        self.values = {}            # address -> (value, stamp)
+        self.used = time.monotonic()
+        self.origins = None         # retained layer, address -> key of folded layer
+
+##################################################################################
+#                               LevelLayers
+#
+#           merges layers into a DMXInterface's levels
+#
+##################################################################################
+
+class LevelLayers(object):
+
+    def __init__(self, interface, mode="ltp", default_priority=100, idle_timeout=0):
+        self.interface = interface
+        self.htp = ( mode == "htp" )
+        self.default_priority = default_priority
+        self.idle_timeout = idle_timeout
+        self.last_expire = time.monotonic()
+        self.layers = {}
+        self.slot_layers = {}       # address -> set of layers containing address
+        self.stamp = 0
+        self.lock = threading.Lock()
+
+#########################################
+#
+#   layerForKey returns key's layer, creating it if needed
+#      idle layers are folded before a layer is created
+#      called with lock held
+#
+#########################################
+    def layerForKey(self, key):
+        layer = self.layers.get(key)
+        if ( layer == None ):
+            self.expireIdle()
+            layer = LevelLayer(key, self.default_priority)
+            self.layers[key] = layer
+        layer.used = time.monotonic()
+        return layer
+
+#########################################
+#
+#   setValues
+#      key-> layer owner
+#      pairs-> list of (address, value 0-255)
+#      slots-> if a list, resolved (address, value) pairs are appended to it
+#         instead of being written to the interface
+#
+#   setValue sets a single address
+#
+#########################################
+    def setValues(self, key, pairs, slots=None):
+        self.checkValues(pairs)
+        with self.lock:
+            layer = self.layerForKey(key)
+            for a, v in pairs:
+                self.stamp += 1
+                layer.values[a] = (v, self.stamp)
+                owners = self.slot_layers.get(a)
+                if ( owners == None ):
+                    owners = set()
+                    self.slot_layers[a] = owners
+                owners.add(layer)
+            self.resolveAddresses(set(a for a, v in pairs), slots)
+
+    def setValue(self, key, address, value):
+        self.setValues(key, [(address, value)])
+
+#########################################
+#
+#   checkValues raises ValueError if an address or value is out of range
+#
+#########################################
+    def checkValues(self, pairs):
+        size = len(self.interface.level_buffer)
+        for a, v in pairs:
+            if ( a < 1 or a > size or v < 0 or v > 255 ):
+                raise ValueError("address %s at %s is out of range" % (a, v))
+
+#########################################
+#
+#   currentValue returns key's value for address
+#      or the output value if the layer does not contain address
+#
+#########################################
+    def currentValue(self, key, address):
+        with self.lock:
+            layer = self.layers.get(key)
+            if ( layer != None and address in layer.values ):
+                return layer.values[address][0]
+        return self.interface.getDMXValue(address)
+
+#########################################
+#
+#   setPriority changes the priority of key's layer
+#   release removes key's layer
+#      both resolve every address in the layer again
+#
+#########################################
+    def setPriority(self, key, priority, slots=None):
+        with self.lock:
+            layer = self.layerForKey(key)
+            if ( layer.priority != priority ):
+                layer.priority = priority
+                self.resolveAddresses(layer.values.keys(), slots)
+
+    def release(self, key, slots=None):
+        with self.lock:
+            released = set(self.releaseFolded(key))
+            layer = self.layers.pop(key, None)
+            if ( layer != None ):
+                for a in layer.values:
+                    self.removeOwner(a, layer)
+                released.update(layer.values.keys())
+            if ( len(released) > 0 ):
+                self.resolveAddresses(released, slots)
+
+    def removeOwner(self, address, layer):
+        owners = self.slot_layers[address]
+        owners.discard(layer)
+        if ( len(owners) == 0 ):
+            del self.slot_layers[address]
+
+#########################################
+#
+#   expireIdle
+#      folds layers keyed by an ip address that have not been used
+#      for idle_timeout seconds, at most once a second
+#      called with lock held
+#
+#########################################
+    def expireIdle(self):
+        now = time.monotonic()
+        if ( self.idle_timeout <= 0 or now - self.last_expire < 1.0 ):
+            return
+        self.last_expire = now
+        for layer in list(self.layers.values()):
+            if ( layer.origins == None and now - layer.used > self.idle_timeout ):
+                if ( LevelLayers.isAddressKey(layer.key) ):
+                    self.fold(layer)
+
+    def isAddressKey(key):
+        try:
+            ipaddress.ip_address(key)
+            return True
+        except ValueError:
+            return False
+
+#########################################
+#
+#   fold
+#      moves layer's values into the retained layer of the same priority
+#      an address keeps whichever value would win the merge,
+#      so no address needs to be resolved again
+#      called with lock held
+#
+#########################################
+    def fold(self, layer):
+        del self.layers[layer.key]
+        key = ("retained", layer.priority)
+        retained = self.layers.get(key)
+        if ( retained == None ):
+            retained = LevelLayer(key, layer.priority)
+            retained.origins = {}
+            self.layers[key] = retained
+        for a, (v, stamp) in layer.values.items():
+            owners = self.slot_layers[a]
+            owners.discard(layer)
+            old = retained.values.get(a)
+            if ( old == None or self.rank(layer.priority, v, stamp) > self.rank(layer.priority, old[0], old[1]) ):
+                retained.values[a] = (v, stamp)
+                retained.origins[a] = layer.key
+            owners.add(retained)
+
+#########################################
+#
+#   releaseFolded
+#      removes the values key left in retained layers
+#      returns list of the addresses removed, which need to be resolved
+#      called with lock held
+#
+#########################################
+    def releaseFolded(self, key):
+        released = []
+        for retained in [l for l in self.layers.values() if l.origins != None]:
+            addresses = [a for a, k in retained.origins.items() if k == key]
+            for a in addresses:
+                del retained.values[a]
+                del retained.origins[a]
+                self.removeOwner(a, retained)
+            if ( len(retained.values) == 0 ):
+                del self.layers[retained.key]
+            released.extend(addresses)
+        return released
+
+#########################################
+#
+#   resolveAddresses
+#      writes the winning value of each address to the interface
+#      or appends it to slots if slots is a list
+#      called with lock held
+#
+#########################################
+    def resolveAddresses(self, addresses, slots=None):
+        resolved = []
+        for a in addresses:
+            resolved.append((a, self.resolve(a)))
+        if ( slots != None ):
+            slots.extend(resolved)
+        else:
+            self.interface.setDMXSlots(resolved)
+
+    def resolve(self, address):
+        best = None
+        best_rank = None
+        for layer in self.slot_layers.get(address, ()):
+            v, stamp = layer.values[address]
+            rank = self.rank(layer.priority, v, stamp)
+            if ( best_rank == None or rank > best_rank ):
+                best_rank = rank
+                best = v
+        if ( best == None ):
+            return 0
+        return best
+
+    def rank(self, priority, v, stamp):
+        if ( self.htp ):
+            return (priority, v, stamp)
+        return (priority, stamp)
@@ -0,0 +1,136 @@
+#   LocalControl.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+
+#################################################################
+#
+#   This file contains shared memory control for processes on the same host
+#
+#   two SharedFrameStore segments are created:
+#      NAME_in   written by one local process, read by web2dmx each frame
+#      NAME_out  written by web2dmx with the output levels (before curves)
+#
+#   a local process attaches with LocalControl.connect("NAME") and
+#   writes to the first store with writeSlots([(address, value), ...]),
+#   publish(levels) or directly into buf between beginWrite() and endWrite()
+#   only one process may write to NAME_in at a time
+#
+#   changes are found by comparing universe generations each frame
+#   and are applied as one layer like the levels from an HTTP client
+#
+#################################################################
+
+from SharedFrameStore import SharedFrameStore
+from ArtNet import DMXInterface
+
+##################################################################################
+#                               LocalControl
+#
+#           input and output frame stores polled on the interface's event loop
+#
+##################################################################################
+
+class LocalControl(object):
+
+#########################################
+#
+#   init
+#      interface-> DMXInterface whose levels are mirrored
+#      name-> prefix of the segment names
+#      apply-> called with list of (address, value) changed in NAME_in
+#      frame_rate-> times per second NAME_in is checked
+#
+#########################################
+    def __init__(self, interface, name, apply, frame_rate=44):
+        self.interface = interface
+        self.apply = apply
+        self.interval = 1.0 / frame_rate
+        size = len(interface.level_buffer)
+        universes = (size + 511) // 512
+        self.input = SharedFrameStore(universes, name + "_in", True)
+        self.output = SharedFrameStore(universes, name + "_out", True)
+        self.frame = bytearray(512 * universes)
+        self.applied = bytearray(512 * universes)
+        self.generations = [0] * universes
+        self.size = size
+        self.timer = None
+        self.output.publish(bytes(interface.published_levels).ljust(len(self.frame), b"\x00"))
+
+#########################################
+#
+#   start adds the output mirror as a frame listener
+#      and schedules checking the input on the interface's loop
+#   stop removes them and the segments
+#
+#########################################
+    def start(self):
+        self.interface.addFrameListener(self)
+        self.interface.startLoop()
+        self.interface.callOnLoop(self.check)
+
+    def stop(self):
+        self.interface.removeFrameListener(self)
+        if ( self.interface.loop != None ):
+            self.interface.callOnLoop(self.closeStores)
+        else:
+            self.closeStores()
+
+    def closeStores(self):
+        if ( self.timer != None ):
+            self.timer.cancel()
+            self.timer = None
+        self.input.close()
+        self.output.close()
+
+#########################################
+#
+#   frameChanged (DMXInterface frame listener method)
+#      writes changed slots to NAME_out, called with the interface's lock held
+#
+#########################################
+    def frameChanged(self, generation, changes):
+        if ( changes != None ):
+            self.output.writeSlots(changes)
+
+#########################################
+#
+#   check
+#      loop timer that reads universes of NAME_in with a new generation
+#      and applies the slots that differ from what was last applied
+#
+#########################################
+    def check(self):
+        self.timer = None
+        changed = False
+        for u in range(len(self.generations)):
+            g = self.input.universeGeneration(u)
+            if ( g != self.generations[u] ):
+                g = self.input.readUniverse(u, self.frame, 512 * u)
+                if ( g != None ):
+                    self.generations[u] = g
+                    changed = True
+        if ( changed ):
+            changes = [(a, v) for a, v in DMXInterface.changedSlots(self.applied, self.frame) if a <= self.size]
+            if ( len(changes) > 0 ):
+                self.applied[:] = self.frame
+                try:
+                    self.apply(changes)
+                except Exception as e:
+                    print ("Local control error: ", e)
+        self.timer = self.interface.loop.call_later(self.interval, self.check)
+
+#########################################
+#
+#   connect
+#      for use by local processes
+#      returns (NAME_in, NAME_out) SharedFrameStores attached without tracking
+#
+#########################################
+    def connect(name):
+        return (SharedFrameStore(name=name + "_in", track=False),
+                SharedFrameStore(name=name + "_out", track=False))
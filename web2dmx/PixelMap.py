@@ -0,0 +1,180 @@
+#   PixelMap.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+
+#################################################################
+#
+#   This file contains mapping of RGB image frames onto pixel fixtures
+#
+#   a frame is width x height pixels of 3 bytes (r, g, b) row by row
+#   a strip maps count pixels starting at x, y and stepping dx, dy
+#   to consecutive fixtures starting at universe (0 based) and address
+#   a fixture that would cross the end of a universe starts the next one
+#
+#   map file (JSON):
+#      {"width": 64, "height": 8, "strips": [
+#         {"x": 0, "y": 0, "dx": 1, "dy": 0, "count": 64, "universe": 0, "address": 1},
+#         {"x": 63, "y": 1, "dx": -1, "dy": 0, "count": 64, "universe": 0, "address": 193,
+#          "order": "grb"}]}
+#
+#   the map is compiled into index arrays once
+#   with numpy, each frame is one fancy-indexed assignment
+#   otherwise contiguous runs are copied as slices, or when there are
+#   many short runs, slots are gathered with one itemgetter call
+#
+#################################################################
+
+import json
+import operator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+##################################################################################
+#                               PixelMap
+#
+#           compiled pixel to slot mapping
+#
+##################################################################################
+
+class PixelMap(object):
+
+#########################################
+#
+#   init
+#      width, height-> size of frames in pixels
+#      size-> number of slots that can be mapped
+#
+#########################################
+    def __init__(self, width, height, size):
+        self.width = width
+        self.height = height
+        self.size = size
+        self.slots = {}         # slot index -> frame byte index
+        self.compiled = False
+
+    def frameSize(self):
+        return self.width * self.height * 3
+
+#########################################
+#
+#   addStrip
+#      raises ValueError if count, universe or address is negative or zero
+#      where that is not allowed, a pixel is outside the frame
+#      or a slot is beyond size
+#
+#########################################
+    def addStrip(self, x, y, dx, dy, count, universe, address, order="rgb"):
+        if ( len(order) == 0 or any(c not in "rgb" for c in order) ):
+            raise ValueError("order %s must be made of r, g and b" % order)
+        if ( count < 0 ):
+            raise ValueError("count %d is negative" % count)
+        if ( universe < 0 or address < 1 or address > 512 ):
+            raise ValueError("universe %d address %d is out of range" % (universe, address))
+        for i in range(count):
+            px = x + i * dx
+            py = y + i * dy
+            if ( px < 0 or px >= self.width or py < 0 or py >= self.height ):
+                raise ValueError("pixel %d,%d is outside the frame" % (px, py))
+            if ( address + len(order) - 1 > 512 ):
+                universe += 1
+                address = 1
+            pixel = (py * self.width + px) * 3
+            for c in range(len(order)):
+                slot = universe * 512 + address - 1 + c
+                if ( slot >= self.size ):
+                    raise ValueError("universe %d address %d is out of range" % (universe, address + c))
+                self.slots[slot] = pixel + "rgb".index(order[c])
+            address += len(order)
+        self.compiled = False
+
+#########################################
+#
+#   compile
+#      builds the index arrays used by mapFrame
+#
+#########################################
+    def compile(self):
+        dst = sorted(self.slots)
+        src = [self.slots[d] for d in dst]
+        self.copies = []        # (slot, frame byte, length) contiguous in both
+        for d, s in zip(dst, src):
+            if ( len(self.copies) > 0 ):
+                cd, cs, n = self.copies[-1]
+                if ( d == cd + n and s == cs + n ):
+                    self.copies[-1] = (cd, cs, n + 1)
+                    continue
+            self.copies.append((d, s, 1))
+        self.runs = []          # (slot, gathered index, length) contiguous slots
+        for i, d in enumerate(dst):
+            if ( len(self.runs) > 0 ):
+                rd, ri, n = self.runs[-1]
+                if ( d == rd + n ):
+                    self.runs[-1] = (rd, ri, n + 1)
+                    continue
+            self.runs.append((d, i, 1))
+        self.use_copies = ( len(self.copies) * 8 <= len(dst) )
+        self.gather = None
+        if ( len(src) > 1 ):
+            self.gather = operator.itemgetter(*src)
+        elif ( len(src) == 1 ):
+            self.gather = lambda frame: (frame[src[0]],)
+        if ( numpy != None ):
+            self.np_dst = numpy.array(dst, dtype=numpy.intp)
+            self.np_src = numpy.array(src, dtype=numpy.intp)
+        self.compiled = True
+
+#########################################
+#
+#   mapFrame
+#      frame-> bytes of one RGB frame
+#      levels-> bytearray of slots written with mapped pixels
+#      raises ValueError if frame is not frameSize() bytes
+#
+#########################################
+    def mapFrame(self, frame, levels):
+        if ( len(frame) != self.frameSize() ):
+            raise ValueError("frame is %d bytes, expected %d" % (len(frame), self.frameSize()))
+        if ( not self.compiled ):
+            self.compile()
+        if ( self.gather == None ):
+            return
+        if ( numpy != None ):
+            view = numpy.frombuffer(levels, dtype=numpy.uint8)
+            view[self.np_dst] = numpy.frombuffer(frame, dtype=numpy.uint8)[self.np_src]
+        elif ( self.use_copies ):
+            for d, s, n in self.copies:
+                levels[d:d+n] = frame[s:s+n]
+        else:
+            gathered = bytes(self.gather(frame))
+            for d, i, n in self.runs:
+                levels[d:d+n] = gathered[i:i+n]
+
+#########################################
+#
+#   loadPixelMap
+#      returns compiled PixelMap from JSON map file
+#      raises ValueError if the file is not a valid map
+#
+#########################################
+    def loadPixelMap(path, size):
+        with open(path, 'r') as f:
+            config = json.load(f)
+        try:
+            pixel_map = PixelMap(int(config["width"]), int(config["height"]), size)
+            for strip in config["strips"]:
+                pixel_map.addStrip(int(strip.get("x", 0)), int(strip.get("y", 0)),
+                                   int(strip.get("dx", 1)), int(strip.get("dy", 0)),
+                                   int(strip["count"]), int(strip.get("universe", 0)),
+                                   int(strip.get("address", 1)), strip.get("order", "rgb"))
+        except (KeyError, TypeError) as e:
+            raise ValueError("invalid pixel map: %s" % e)
+        pixel_map.compile()
+        return pixel_map
@@ -0,0 +1,214 @@
+#   Profiler.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+
+#################################################################
+#
+#   This file contains an on demand sampling profiler
+#
+#   while a profile runs, the requesting thread reads the stack of every
+#   other thread each interval and counts the functions found
+#   self time is counted for the function at the top of a stack,
+#   total time for every function in it
+#   threads started with the same target are counted together
+#
+#   registered locks are wrapped for the profile so the time spent
+#   waiting to acquire them is recorded for each caller.
+#   The wrapper uses the same lock, it is removed when the profile ends.
+#
+#   nothing is installed when a profile is not running
+#
+#################################################################
+
+import sys
+import threading
+import time
+
+MAX_DURATION = 60.0
+MIN_INTERVAL = 0.0005
+
+##################################################################################
+#                               TimedLock
+#
+#           wraps a lock recording how long acquire waits
+#
+##################################################################################
+
+class TimedLock(object):
+
+    def __init__(self, lock, name, profiler):
+        self.lock = lock
+        self.name = name
+        self.profiler = profiler
+
+    def acquire(self, blocking=True, timeout=-1):
+        return self.timedAcquire(sys._getframe(1), blocking, timeout)
+
+    def timedAcquire(self, caller, blocking=True, timeout=-1):
+        t0 = time.perf_counter()
+        result = self.lock.acquire(blocking, timeout)
+        self.profiler.lockWaited(self.name, caller.f_code.co_name, time.perf_counter() - t0)
+        return result
+
+    def release(self):
+        self.lock.release()
+
+    def locked(self):
+        return self.lock.locked()
+
+    def __enter__(self):
+        self.timedAcquire(sys._getframe(1))
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.lock.release()
+
+##################################################################################
+#                               Profiler
+#
+#           samples all threads for a bounded window
+#
+##################################################################################
+
+class Profiler(object):
+
+    def __init__(self):
+        self.locks = []             # (owner object, attribute name, report name)
+        self.running = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.lock_waits = {}        # (lock name, caller) -> [count, total, max]
+
+#########################################
+#
+#   addLock registers owner.attribute as a lock timed during profiles
+#
+#########################################
+    def addLock(self, owner, attribute, name):
+        self.locks.append((owner, attribute, name))
+
+    def lockWaited(self, name, caller, wait):
+        with self.stats_lock:
+            w = self.lock_waits.get((name, caller))
+            if ( w == None ):
+                self.lock_waits[(name, caller)] = [1, wait, wait]
+            else:
+                w[0] += 1
+                w[1] += wait
+                if ( wait > w[2] ):
+                    w[2] = wait
+
+#########################################
+#
+#   profile
+#      samples for duration seconds every interval seconds
+#      returns text report or None if a profile is already running
+#
+#########################################
+    def profile(self, duration=5.0, interval=0.001, limit=40):
+        if ( not self.running.acquire(False) ):
+            return None
+        try:
+            duration = min(max(duration, interval), MAX_DURATION)
+            interval = max(interval, MIN_INTERVAL)
+            self.lock_waits = {}
+            originals = self.wrapLocks()
+            try:
+                samples = self.sample(duration, interval)
+            finally:
+                self.unwrapLocks(originals)
+            return self.report(samples, limit)
+        finally:
+            self.running.release()
+
+    def wrapLocks(self):
+        originals = []
+        for owner, attribute, name in self.locks:
+            lock = getattr(owner, attribute)
+            originals.append((owner, attribute, lock))
+            setattr(owner, attribute, TimedLock(lock, name, self))
+        return originals
+
+    def unwrapLocks(self, originals):
+        for owner, attribute, lock in originals:
+            setattr(owner, attribute, lock)
+
+#########################################
+#
+#   sample
+#      returns dictionary of sample counts
+#
+#########################################
+    def sample(self, duration, interval):
+        me = threading.get_ident()
+        names = {}
+        own = {}                # (thread, function) -> samples at top of stack
+        total = {}              # function -> samples anywhere in stack
+        count = 0
+        start = time.perf_counter()
+        end = start + duration
+        while ( time.perf_counter() < end ):
+            for tid, frame in sys._current_frames().items():
+                if ( tid == me ):
+                    continue
+                name = names.get(tid)
+                if ( name == None ):
+                    names = dict((t.ident, threadName(t)) for t in threading.enumerate())
+                    name = names.get(tid, str(tid))
+                key = (name, functionKey(frame.f_code))
+                own[key] = own.get(key, 0) + 1
+                seen = set()
+                while ( frame != None ):
+                    f = functionKey(frame.f_code)
+                    if ( f not in seen ):
+                        seen.add(f)
+                        total[f] = total.get(f, 0) + 1
+                    frame = frame.f_back
+            count += 1
+            time.sleep(interval)
+        return {"count": count, "elapsed": time.perf_counter() - start, "own": own, "total": total}
+
+#########################################
+#
+#   report
+#      formats sample counts as milliseconds
+#      (samples x average time between samples)
+#
+#########################################
+    def report(self, samples, limit):
+        count = max(samples["count"], 1)
+        ms = samples["elapsed"] * 1000.0 / count
+        lines = ["profile %.2f s, %d samples every %.2f ms" % (samples["elapsed"], samples["count"], ms), ""]
+        lines.append("self ms by thread")
+        for (thread, f), n in sorted(samples["own"].items(), key=lambda x: -x[1])[:limit]:
+            lines.append("%10.1f  %-24s %s" % (n * ms, thread[:24], f))
+        lines.append("")
+        lines.append("total ms by function")
+        for f, n in sorted(samples["total"].items(), key=lambda x: -x[1])[:limit]:
+            lines.append("%10.1f  %s" % (n * ms, f))
+        lines.append("")
+        lines.append("lock waits      count   total ms     max ms  lock caller")
+        with self.stats_lock:
+            waits = sorted(self.lock_waits.items(), key=lambda x: -x[1][1])
+        for (name, caller), (n, wait, most) in waits[:limit]:
+            lines.append("           %10d %10.3f %10.3f  %s %s" % (n, wait * 1000.0, most * 1000.0, name, caller))
+        return "\n".join(lines) + "\n"
+
+def functionKey(code):
+    return "%s:%d(%s)" % (code.co_filename.split("/")[-1], code.co_firstlineno, code.co_name)
+
+#########################################
+#
+#   threadName
+#      "Thread-12 (process_request_thread)" -> "process_request_thread"
+#
+#########################################
+def threadName(thread):
+    name = thread.name
+    if ( name.startswith("Thread-") and name.endswith(")") and " (" in name ):
+        return name[name.index(" (") + 2:-1]
+    return name
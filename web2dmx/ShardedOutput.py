@@ -0,0 +1,270 @@
+#   ShardedOutput.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+#   Art-Net(TM) Designed by and Copyright Artistic Licence Holdings Ltd.
+
+#################################################################
+#
+#   This file contains Art-Net output for many universes
+#   where universes are divided among worker processes
+#
+#   the web2dmx process writes levels and publishes frames to a SharedFrameStore
+#   each worker process owns a socket and send loop for its universes
+#   and reads frames directly from shared memory
+#
+#################################################################
+
+import socket
+import time
+import multiprocessing
+from ArtNet import DMXInterface, ArtNetInterface
+from SharedFrameStore import SharedFrameStore
+
+##################################################################################
+#                               ShardedOutput
+#
+#           DMXInterface for universe_count universes sent by worker processes
+#           addresses continue across universes, 513 is slot 1 of the second universe
+#
+##################################################################################
+
+class ShardedOutput(DMXInterface):
+
+    def __init__(self, target, universe_count, workers, first_universe=0, frame_rate=44):
+        super().__init__()
+        self.target = target
+        self.universe_count = universe_count
+        self.worker_count = max(1, min(workers, universe_count))
+        self.first_universe = first_universe
+        self.frame_rate = frame_rate
+        self.routes = [("0.0.0.0", target)] * universe_count
+        self.curves = None
+        self.recorder = None
+        self.processes = []
+        self.level_buffer = bytearray(512 * universe_count)
+        self.published_levels = bytearray(512 * universe_count)
+        self.frame_buffer = bytearray(512 * universe_count)
+        self.store = SharedFrameStore(universe_count)
+        self.stop_event = multiprocessing.Event()
+        self.ok = True
+
+    def port(self):
+        return 0x1936
+
+#########################################
+#
+#   universesForWorker
+#      universes are dealt to workers round robin
+#
+#########################################
+    def universesForWorker(self, w):
+        return list(range(w, self.universe_count, self.worker_count))
+
+#########################################
+#
+#   setInterfaceRoutes
+#      interfaces-> list of CTNetUtil interface entries (name, ip, netmask, broadcast)
+#      assignments-> dictionary of interface name to list of universes (0 based)
+#         universes not assigned are dealt to interfaces round robin
+#      broadcast-> True to send to each interface's broadcast address
+#         False to send to target through each interface
+#
+#########################################
+    def setInterfaceRoutes(self, interfaces, assignments, broadcast):
+        if ( len(interfaces) == 0 ):
+            return
+        routes = [None] * self.universe_count
+        for iface in interfaces:
+            for u in assignments.get(iface[0], []):
+                if ( u >= 0 and u < self.universe_count ):
+                    routes[u] = iface
+        i = 0
+        for u in range(self.universe_count):
+            if ( routes[u] == None ):
+                routes[u] = interfaces[i % len(interfaces)]
+                i += 1
+        for u in range(self.universe_count):
+            iface = routes[u]
+            if ( broadcast ):
+                routes[u] = (iface[1], iface[3])
+            else:
+                routes[u] = (iface[1], self.target)
+        self.routes = routes
+
+#########################################
+#
+#   startSending starts a process for each worker
+#
+#########################################
+    def startSending(self):
+        self.sending = True
+        if ( len(self.processes) == 0 ):
+            self.stop_event.clear()
+            self.sendDMXNow()
+            for w in range(self.worker_count):
+                universes = [(u, self.routes[u][0], self.routes[u][1]) for u in self.universesForWorker(w)]
+                p = multiprocessing.Process(target=runShardWorker,
+                        args=(self.store.name, universes, self.first_universe,
+                              self.port(), self.frame_rate, self.stop_event))
+                p.daemon = True
+                p.start()
+                self.processes.append(p)
+
+    def stopSending(self):
+        self.sending = False
+        self.stop_event.set()
+        for p in self.processes:
+            p.join(2)
+        self.processes = []
+
+    def close(self):
+        self.stopSending()
+        self.store.close()
+
+#########################################
+#
+#   setDimmerCurves and setRecorder match ArtNetInterface
+#
+#########################################
+    def setDimmerCurves(self, curves):
+        with self.lock:
+            if ( curves != None and curves.isLinear() ):
+                curves = None
+            self.curves = curves
+            self.translateLevels()
+
+    def setRecorder(self, recorder):
+        with self.lock:
+            self.recorder = recorder
+
+#########################################
+#
+#   translateLevels
+#      applies dimmer curves and writes the frame to the shared frame store
+#      called with lock held
+#
+#########################################
+    def translateLevels(self):
+        if ( self.curves == None ):
+            frame = self.published_levels
+        else:
+            self.curves.applyCurves(self.published_levels, self.frame_buffer, 0)
+            frame = self.frame_buffer
+        self.store.publish(frame)
+
+#########################################
+#
+#   sendDMXNow
+#      publishes levels to the shared frame store
+#      workers send changed universes on their next frame
+#
+#########################################
+    def sendDMXNow(self):
+        with self.lock:
+            self.publishFrame()
+            if ( self.recorder != None ):
+                for u in range(self.universe_count):
+                    self.recorder.recordFrame(False, self.first_universe + u, self.published_levels[512*u:512*(u+1)])
+        self.last_send_time = time.time()
+
+#########################################
+#
+#   set and get levels, addresses are 1 to 512 * universe_count
+#
+#########################################
+    def setDMXValue(self, address, value):
+        with self.lock:
+            self.level_buffer[address-1] = value
+
+    def setDMXLevel(self, address, level):
+        self.level_buffer[address-1] = ArtNetInterface.level2dmx(level)
+
+    def setDMXValues(self, values):
+        with self.lock:
+            n = min(len(values), len(self.level_buffer))
+            self.level_buffer[0:n] = values[0:n]
+
+    def getDMXValue(self, address):
+        return self.level_buffer[address-1]
+
+    def getDMXLevel(self, address):
+        return ArtNetInterface.dmx2level(self.level_buffer[address-1])
+
+#########################################
+#
+#   runShardWorker
+#      entry point of a worker process
+#      universes-> list of (universe, interface ip, destination ip)
+#      opens one socket bound to each interface
+#      sends each universe when its generation changes
+#      and refreshes every universe every 2 seconds
+#
+#########################################
+def runShardWorker(store_name, universes, first_universe, port, frame_rate, stop_event):
+    store = SharedFrameStore(name=store_name)
+    sockets = {}
+    routes = {}
+    packets = {}
+    generations = {}
+    for u, bind_ip, dest in universes:
+        if ( bind_ip not in sockets ):
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            s.bind((bind_ip, 0))
+            sockets[bind_ip] = s
+        routes[u] = (sockets[bind_ip], (dest, port))
+        packets[u] = artDMXPacket(first_universe + u)
+        generations[u] = None
+    seqcounter = 0
+    last_refresh = 0.0
+    interval = 1.0 / frame_rate
+    next_frame = time.monotonic()
+    try:
+        while not stop_event.is_set():
+            now = time.monotonic()
+            refresh = ( now - last_refresh >= 2 )
+            seqcounter = (seqcounter + 1) & 0xFF
+            if ( seqcounter == 0 ):
+                seqcounter = 1
+            for u in packets:
+                if ( refresh or store.universeGeneration(u) != generations[u] ):
+                    packet = packets[u]
+                    g = store.readUniverse(u, packet, 18)
+                    if ( g != None ):
+                        generations[u] = g
+                        packet[12] = seqcounter
+                        s, dest = routes[u]
+                        s.sendto(packet, dest)
+            if ( refresh ):
+                last_refresh = now
+            next_frame += interval
+            wait = next_frame - time.monotonic()
+            if ( wait > 0 ):
+                time.sleep(wait)
+            else:
+                next_frame = time.monotonic()
+    finally:
+        for s in sockets.values():
+            s.close()
+        store.close()
+
+#########################################
+#
+#   artDMXPacket
+#      returns ArtDMX buffer for 15 bit port address
+#
+#########################################
+def artDMXPacket(port_address):
+    packet = bytearray(530)
+    packet[0:8] = b"Art-Net\x00"
+    packet[9] = 0x50                        #opcode l/h
+    packet[11] = 14                         #version h/l
+    packet[14] = port_address & 0xFF        #subnet/universe
+    packet[15] = (port_address >> 8) & 0x7F #net
+    packet[16] = 2                          #dmxcount h/l
+    return packet
@@ -0,0 +1,201 @@
+#   SharedFrameStore.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+
+#################################################################
+#
+#   This file contains a shared memory store of DMX frames
+#   for several universes which can be read by other processes
+#
+#   layout (native byte order):
+#      sequence(Q) universe_count(I) reserved(I)
+#      universe generation(Q) for each universe
+#      512 slots for each universe
+#
+#   the sequence is a seqlock.  It is odd while a frame is being written.
+#   readers copy a universe and retry if the sequence changed while copying.
+#   a universe's generation increments each time its slots change.
+#
+#################################################################
+
+import struct
+import time
+from multiprocessing import shared_memory
+from multiprocessing import resource_tracker
+
+STORE_HEADER = struct.Struct("=QII")
+STORE_GENERATION = struct.Struct("=Q")
+
+##################################################################################
+#                               SharedFrameStore
+#
+#           DMX frames in a multiprocessing.shared_memory segment
+#
+##################################################################################
+
+class SharedFrameStore(object):
+
+#########################################
+#
+#   init creates a new segment if name is None or create is True
+#      a stale segment left with the same name is replaced
+#   otherwise attaches to the existing segment
+#      track-> False for processes not started by the owner
+#         so that their resource tracker does not unlink the segment when they exit
+#
+#########################################
+    def __init__(self, universe_count=1, name=None, create=False, track=True):
+        if ( name == None or create ):
+            size = SharedFrameStore.segmentSize(universe_count)
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.owner = True
+            self.shm.buf[0:size] = bytes(size)
+            STORE_HEADER.pack_into(self.shm.buf, 0, 0, universe_count, 0)
+        else:
+            self.shm = SharedFrameStore.attach(name, track)
+            self.owner = False
+            universe_count = STORE_HEADER.unpack_from(self.shm.buf, 0)[1]
+        self.name = self.shm.name
+        self.universe_count = universe_count
+        self.data_offset = STORE_HEADER.size + STORE_GENERATION.size * universe_count
+        self.buf = self.shm.buf
+
+    def attach(name, track=True):
+        if ( track ):
+            return shared_memory.SharedMemory(name=name)
+        try:
+            #   python 3.13
+            return shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+            return shm
+
+    def segmentSize(universe_count):
+        return STORE_HEADER.size + (STORE_GENERATION.size + 512) * universe_count
+
+#########################################
+#
+#   sequence returns the seqlock counter
+#   universeGeneration returns the change counter for universe u (0 based)
+#
+#########################################
+    def sequence(self):
+        return STORE_GENERATION.unpack_from(self.buf, 0)[0]
+
+    def universeGeneration(self, u):
+        return STORE_GENERATION.unpack_from(self.buf, STORE_HEADER.size + STORE_GENERATION.size * u)[0]
+
+    def universeOffset(self, u):
+        return self.data_offset + 512 * u
+
+#########################################
+#
+#   beginWrite and endWrite bracket changes to the frame
+#   only one process or thread may write at a time
+#
+#########################################
+    def beginWrite(self):
+        STORE_GENERATION.pack_into(self.buf, 0, self.sequence() | 1)
+
+    def endWrite(self):
+        STORE_GENERATION.pack_into(self.buf, 0, self.sequence() + 1)
+
+#########################################
+#
+#   publish
+#      levels-> slots for all universes, 512 per universe
+#      copies each universe that differs from the stored frame
+#      and increments that universe's generation
+#      returns number of universes changed
+#
+#########################################
+    def publish(self, levels):
+        changed = 0
+        count = min(self.universe_count, len(levels) // 512)
+        self.beginWrite()
+        try:
+            for u in range(count):
+                o = self.universeOffset(u)
+                src = levels[512*u:512*(u+1)]
+                if ( self.buf[o:o+512] != src ):
+                    self.buf[o:o+512] = src
+                    self.bumpGeneration(u)
+                    changed += 1
+        finally:
+            self.endWrite()
+        return changed
+
+#########################################
+#
+#   writeSlots
+#      slots-> list of (address, value) with addresses across universes
+#         (address 513 is universe 1 slot 1)
+#      increments the generation of each universe written
+#      raises ValueError if an address is out of range
+#
+#########################################
+    def writeSlots(self, slots):
+        touched = set()
+        self.beginWrite()
+        try:
+            for a, v in slots:
+                if ( a < 1 or a > 512 * self.universe_count ):
+                    raise ValueError("address %s is out of range" % a)
+                u = (a - 1) // 512
+                self.buf[self.data_offset + a - 1] = v
+                touched.add(u)
+            for u in touched:
+                self.bumpGeneration(u)
+        finally:
+            self.endWrite()
+
+    def bumpGeneration(self, u):
+        go = STORE_HEADER.size + STORE_GENERATION.size * u
+        STORE_GENERATION.pack_into(self.buf, go, STORE_GENERATION.unpack_from(self.buf, go)[0] + 1)
+
+#########################################
+#
+#   readUniverse
+#      copies universe u into out starting at offset
+#      returns the universe generation that was read
+#      or None if a consistent copy could not be made
+#
+#########################################
+    def readUniverse(self, u, out, offset, retries=100):
+        o = self.universeOffset(u)
+        for i in range(retries):
+            s1 = self.sequence()
+            if ( s1 & 1 ):
+                time.sleep(0)
+                continue
+            g = self.universeGeneration(u)
+            out[offset:offset+512] = self.buf[o:o+512]
+            if ( self.sequence() == s1 ):
+                return g
+        return None
+
+#########################################
+#
+#   close detaches from the segment, the creating process also unlinks it
+#
+#########################################
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if ( self.owner ):
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,195 @@
+#   UDPCommandListener.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+
+#################################################################
+#
+#   This file contains a UDP port for fire and forget level commands
+#
+#   one command per datagram, nothing is sent in reply
+#
+#   text, the same query as an HTTP request:
+#      set=1x50_2x60&token=NAME&priority=150
+#      setl=1x50_60_70
+#      release=1
+#
+#   OSC message (levels are percent 0-100, int or float):
+#      /set   address level address level ...
+#      /setl  start level level ...
+#      /dmx   start blob of DMX values (0-255)
+#
+#   the layer is the token or the sender's ip address
+#   commands are applied through the owner's batch path
+#   commands received while the owner is not accepting are dropped
+#
+#################################################################
+
+import socket
+import struct
+import time
+from ArtNet import ArtNetInterface
+
+OSC_INT = struct.Struct(">i")
+OSC_FLOAT = struct.Struct(">f")
+
+##################################################################################
+#                               UDPCommandListener
+#
+#           command socket read on the interface's event loop
+#
+##################################################################################
+
+class UDPCommandListener(object):
+
+#########################################
+#
+#   init
+#      owner-> must respond to createBatch, apply_batch, accepting,
+#         set_layer_priority and release_layer
+#      parser-> must respond to queryItems, setPairs and setlPairs
+#      interface-> DMXInterface whose event loop reads the socket
+#
+#########################################
+    def __init__(self, owner, parser, interface, host, port):
+        self.owner = owner
+        self.parser = parser
+        self.interface = interface
+        self.receive_buffer = bytearray(2048)
+        self.received = 0
+        self.errors = 0
+        self.dropped = 0
+        self.udpsocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udpsocket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1048576)
+        self.udpsocket.bind((host, port))
+
+#########################################
+#
+#   start adds the socket to the interface's event loop readers
+#   stop removes it and closes the socket
+#
+#########################################
+    def start(self):
+        self.interface.startLoop()
+        self.interface.callOnLoop(self.interface.loop.add_reader, self.udpsocket, self.receive)
+
+    def stop(self):
+        if ( self.interface.loop != None ):
+            self.interface.callOnLoop(self.closeSocket)
+        else:
+            self.closeSocket()
+
+    def closeSocket(self):
+        if ( self.interface.loop != None ):
+            self.interface.loop.remove_reader(self.udpsocket)
+        self.udpsocket.close()
+
+#########################################
+#
+#   receive is called by the event loop when the socket is readable
+#
+#########################################
+    def receive(self):
+        try:
+            n, addr = self.udpsocket.recvfrom_into(self.receive_buffer)
+        except (BlockingIOError, InterruptedError):
+            return
+        self.received += 1
+        if ( not self.owner.accepting() ):
+            self.dropped += 1
+            return
+        data = bytes(self.receive_buffer[0:n])
+        try:
+            if ( data.startswith(b"/") ):
+                self.oscReceived(data, addr[0])
+            else:
+                self.queryReceived(data.decode("utf-8").strip(), addr[0])
+        except (ValueError, OverflowError, TypeError, IndexError, UnicodeDecodeError, struct.error) as e:
+            self.errors += 1
+            print ("UDP command error from ", addr[0], ": ", e)
+
+#########################################
+#
+#   queryReceived
+#      applies set, setl, token, priority and release like an HTTP query
+#
+#########################################
+    def queryReceived(self, query, layer):
+        t0 = time.perf_counter()
+        pairs = []
+        release = False
+        priority = None
+        for k, v in self.parser.queryItems(query):
+            if ( k == "set" ):
+                pairs.extend(self.parser.setPairs(v))
+            elif ( k == "setl" ):
+                pairs.extend(self.parser.setlPairs(v))
+            elif ( k == "token" ):
+                layer = "token:" + v
+            elif ( k == "priority" ):
+                priority = int(v)
+            elif ( k == "release" ):
+                release = True
+        if ( priority != None ):
+            self.owner.set_layer_priority(layer, priority)
+        if ( release ):
+            self.owner.release_layer(layer)
+        if ( len(pairs) > 0 ):
+            self.applyPairs(layer, "query", [(a, ArtNetInterface.level2dmx(v)) for a, v in pairs], t0)
+
+#########################################
+#
+#   oscReceived
+#      applies an OSC /set, /setl or /dmx message
+#
+#########################################
+    def oscReceived(self, data, layer):
+        t0 = time.perf_counter()
+        address, offset = oscString(data, 0)
+        tags, offset = oscString(data, offset)
+        args = []
+        for t in tags[1:]:
+            if ( t == "i" ):
+                args.append(OSC_INT.unpack_from(data, offset)[0])
+                offset += 4
+            elif ( t == "f" ):
+                args.append(OSC_FLOAT.unpack_from(data, offset)[0])
+                offset += 4
+            elif ( t == "b" ):
+                n = OSC_INT.unpack_from(data, offset)[0]
+                args.append(data[offset+4:offset+4+n])
+                offset += 4 + ((n + 3) & ~3)
+            else:
+                raise ValueError("unsupported OSC type %s" % t)
+        if ( address == "/set" ):
+            if ( len(args) % 2 != 0 ):
+                raise ValueError("/set needs address level pairs")
+            pairs = [(int(args[i]), ArtNetInterface.level2dmx(args[i+1])) for i in range(0, len(args) - 1, 2)]
+        elif ( address == "/setl" ):
+            pairs = [(int(args[0]) + i, ArtNetInterface.level2dmx(v)) for i, v in enumerate(args[1:])]
+        elif ( address == "/dmx" ):
+            if ( len(args) != 2 or not isinstance(args[1], bytes) ):
+                raise ValueError("/dmx needs a start address and a blob")
+            pairs = [(int(args[0]) + i, v) for i, v in enumerate(args[1])]
+        else:
+            raise ValueError("unknown OSC address %s" % address)
+        self.applyPairs(layer, address[1:], pairs, t0)
+
+    def applyPairs(self, layer, name, pairs, t0):
+        batch = self.owner.createBatch()
+        batch.addOperation(name, pairs, None, t0)
+        self.owner.apply_batch(layer, batch, False)
+
+#########################################
+#
+#   oscString
+#      returns (string, offset after its 4 byte padding)
+#
+#########################################
+def oscString(data, offset):
+    end = data.index(b"\x00", offset)
+    return (data[offset:end].decode("utf-8"), (end + 4) & ~3)
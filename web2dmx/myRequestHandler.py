@@ -11,8 +11,9 @@ from http.server import BaseHTTPRequestHandler
 
 #################################################################
 #
-#   myRequestHandler extends BaseHTTPRequestHandler to handle GET requests
+#   myRequestHandler extends BaseHTTPRequestHandler to handle GET and POST requests
 #      when a GET request is received, calls class variable owner's doGet method
+#      when a POST request is received, calls class variable owner's doPost method
 #      owner's doGet should callback to myRequestHandler's respond method
 #      if the respond method receives status code 200, OK,
 #      it returns a stream for writing content
@@ -24,6 +25,8 @@ class myRequestHandler(BaseHTTPRequestHandler):
 #   setOwner->owner object to process results of requests
 #      owner is class variable
 #      owner must respond to doGet(self, f(file stream), p(resource path), q(query))
+#      and doPost(self, p(resource path), q(query), body(bytes))
+#      and streamsPost(p(resource path)), doPostStream(self, p, q, length)
 #########################################
     @classmethod
     def setOwner(cls, owner):
@@ -48,13 +51,16 @@ class myRequestHandler(BaseHTTPRequestHandler):
 
 #########################################
 #
-#   respond sends status code
+#   respond sends status code and optional dictionary of extra headers
 #       returns stream for writing content if status code == OK
 #
 #########################################
-    def respond(self, code):
+    def respond(self, code, headers=None):
         self.send_response(code)
         self.send_header("Content-type", "text/html")
+        if ( headers != None ):
+            for k, v in headers.items():
+                self.send_header(k, v)
         self.end_headers()
         if ( code == 200 ):
             return self.wfile
@@ -64,6 +70,37 @@ class myRequestHandler(BaseHTTPRequestHandler):
             self.endHTMLBody()
             return None
 
+#########################################
+#
+#   respondWithContent sends status code, headers and a complete body
+#       body-> bytes or None for no content (eg. 204 or 304)
+#
+#########################################
+    def respondWithContent(self, code, content_type=None, body=None, headers=None):
+        self.send_response(code)
+        if ( headers != None ):
+            for k, v in headers.items():
+                self.send_header(k, v)
+        if ( body != None ):
+            self.send_header("Content-type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if ( body != None ):
+            self.wfile.write(body)
+
+#########################################
+#
+#   respondEventStream sends headers for a text/event-stream
+#       returns stream for writing events
+#
+#########################################
+    def respondEventStream(self):
+        self.send_response(200)
+        self.send_header("Content-type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        return self.wfile
+
 #########################################
 #
 #   override of do_GET
@@ -78,3 +115,31 @@ class myRequestHandler(BaseHTTPRequestHandler):
             self.owner.doGet(self, p[0], p[1])
         else:
             self.owner.doGet(self, p[0], None)
+
+#########################################
+#
+#   override of do_POST
+#      reads the request body, up to max_body bytes, and passes it to owner's doPost
+#      if owner's streamsPost(path) is True, owner's doPostStream
+#      reads the body from rfile itself, any length
+#
+#########################################
+    max_body = 1048576
+
+    def do_POST(self):
+        try:
+            n = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            n = -1
+        p = self.path.split("?")
+        q = None
+        if ( len(p) == 2 ):
+            q = p[1]
+        if ( n >= 0 and self.owner.streamsPost(p[0]) ):
+            self.owner.doPostStream(self, p[0], q, n)
+            return
+        if ( n < 0 or n > self.max_body ):
+            self.respondWithContent(413 if n > 0 else 400)
+            return
+        body = self.rfile.read(n)
+        self.owner.doPost(self, p[0], q, body)
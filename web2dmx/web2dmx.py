@@ -46,10 +46,25 @@
 
 from web2dmxServer import web2dmxServer
 from ArtNet import ArtNetInterface
+from DimmerCurves import DimmerCurves
+from DMXRecorder import DMXRecorder, DMXPlayer
+from ShardedOutput import ShardedOutput
+from LevelEvents import LevelEventClient
+from LevelHistory import LevelHistory
+from LocalControl import LocalControl
+from UDPCommandListener import UDPCommandListener
+from PixelMap import PixelMap
+from CueList import CueList, CueScheduler
+from LevelLayers import LevelLayers
+from CommandQueue import CommandQueue
+from BatchRequest import BatchRequest
+from Profiler import Profiler
 from CTNetUtil import CTNetUtil
 from CTProperties import CTProperties
 import time
 import os
+import concurrent.futures
+import threading
 import sys
 import socket
 import ipaddress
@@ -82,6 +97,7 @@ class web2DMX:
         self.local_ip = None
         self.local_ip = self.get_ip()
         self.html_table = self.properties.stringForKey("html_table", "yes")
+        self.start_tag = int(time.time() * 1000)
 
 #########################################
 #
@@ -90,9 +106,331 @@ class web2DMX:
 #########################################
     def createArtNet(self):
         artout = self.properties.stringForKey("artnet_output", "auto")
-        self.artnet_interface = ArtNetInterface(self.local_ip, artout)
+        workers = self.properties.intForKey("shard_workers", 0)
+        if ( workers > 0 ):
+            self.artnet_interface = self.createShardedOutput(artout, workers)
+        else:
+            self.artnet_interface = self.createArtNetInterface(artout)
+        self.artnet_interface.setDimmerCurves(self.createDimmerCurves())
+        merge = self.properties.stringForKey("merge_mode", "ltp")
+        priority = self.properties.intForKey("layer_priority", 100)
+        idle = self.properties.intForKey("layer_idle_timeout", 600)
+        self.layers = LevelLayers(self.artnet_interface, merge, priority, idle)
+        history = self.properties.intForKey("state_history", 1024)
+        self.history = LevelHistory(self.artnet_interface, self.start_tag, history)
+        self.artnet_interface.addFrameListener(self.history)
+        self.createCommandQueue()
+        self.loadPresets()
         self.artnet_interface.startSending()
         print("Art-Net started.")
+        self.createRecorder()
+        self.createProfiler()
+        self.createLocalControl()
+        self.loadPixelMap()
+        self.loadCueList()
+
+#########################################
+#
+#   createRecorder starts logging frames if record_file is set
+#   and/or starts playing back a log if playback_file is set
+#
+#########################################
+    def createRecorder(self):
+        self.recorder = None
+        self.player = None
+        recfile = self.properties.stringForKey("record_file", "")
+        if ( recfile != "" ):
+            self.recorder = DMXRecorder(recfile)
+            self.artnet_interface.setRecorder(self.recorder)
+            print("Recording to ", recfile)
+        playfile = self.properties.stringForKey("playback_file", "")
+        if ( playfile != "" ):
+            loop = self.properties.stringForKey("playback_loop", "no") == "yes"
+            try:
+                self.player = DMXPlayer(self.artnet_interface, playfile, loop=loop)
+                self.player.startPlaying()
+                print("Playing ", playfile)
+            except (OSError, ValueError) as e:
+                print("Playback error: ", e)
+
+#########################################
+#
+#   closeRecorder stops playback and finishes writing the log
+#
+#########################################
+    def closeRecorder(self):
+        if ( self.player != None ):
+            self.player.stopPlaying()
+        if ( self.recorder != None ):
+            self.artnet_interface.setRecorder(None)
+            self.recorder.close()
+
+#########################################
+#
+#   createArtNetInterface makes single universe output
+#      with discovery timing and node cache from properties
+#
+#########################################
+    def createArtNetInterface(self, artout):
+        interface = ArtNetInterface(self.local_ip, artout)
+        pmin = self.properties.intForKey("poll_interval_min_ms", 500) / 1000.0
+        pmax = self.properties.intForKey("poll_interval_max_ms", 4000) / 1000.0
+        interface.setPollIntervals(pmin, pmax)
+        poll_address = self.properties.stringForKey("poll_address", "")
+        if ( poll_address != "" ):
+            interface.setPollAddress(poll_address)
+        interface.setPollReplyWindow(self.properties.intForKey("poll_reply_window_ms", 100) / 1000.0)
+        interface.setNodeRates(self.nodeRates(), float(self.properties.stringForKey("node_rate", "0")))
+        cache = self.properties.stringForKey("node_cache", "")
+        if ( cache != "" ):
+            interface.setNodeCache(os.path.join(self.appdirectory, cache))
+        return interface
+
+#########################################
+#
+#   nodeRates
+#      returns dictionary of node address or oem_CODE to ArtDMX packets per second
+#      from node_rate_ADDRESS=RATE and node_rate_oem_CODE=RATE in properties
+#
+#########################################
+    def nodeRates(self):
+        rates = {}
+        for key, value in self.properties.properties.items():
+            if ( key.startswith("node_rate_") ):
+                rates[key[10:].lower()] = float(value)
+        return rates
+
+#########################################
+#
+#   createShardedOutput makes output for universe_count universes
+#      sent by worker processes
+#      discovery is not available, auto uses the broadcast address
+#
+#########################################
+    def createShardedOutput(self, artout, workers):
+        broadcast = ( artout == "auto" or artout == "broadcast" )
+        if ( broadcast ):
+            artout = CTNetUtil.findBroadcastAddress(self.local_ip)
+        count = self.properties.intForKey("universe_count", 1)
+        rate = self.properties.intForKey("frame_rate", 44)
+        output = ShardedOutput(artout, count, workers, frame_rate=rate)
+        interfaces, assignments = self.findOutputInterfaces()
+        output.setInterfaceRoutes(interfaces, assignments, broadcast)
+        return output
+
+#########################################
+#
+#   findOutputInterfaces
+#      output_interfaces-> names or addresses of interfaces separated by underscores
+#      interface_universes_NAME-> universes (0 based) sent from interface NAME
+#         eg. interface_universes_eth1=0-3_8
+#      returns list of CTNetUtil interface entries and dictionary of assignments
+#
+#######################################
+    def findOutputInterfaces(self):
+        interfaces = []
+        assignments = {}
+        names = self.properties.stringForKey("output_interfaces", "")
+        for n in names.split("_"):
+            if ( n == "" ):
+                continue
+            iface = CTNetUtil.interfaceNamed(n)
+            if ( iface == None ):
+                print("Unknown output interface ", n)
+                continue
+            interfaces.append(iface)
+            universes = []
+            for r in self.properties.stringForKey("interface_universes_" + n, "").split("_"):
+                fl = r.split("-")
+                if ( len(fl) == 2 ):
+                    universes.extend(range(int(fl[0]), int(fl[1]) + 1))
+                elif ( fl[0] != "" ):
+                    universes.append(int(fl[0]))
+            assignments[iface[0]] = universes
+        return interfaces, assignments
+
+#########################################
+#
+#   createCommandQueue
+#      if command_queue is yes, levels set by requests are applied
+#      by a frame builder thread instead of the request's thread
+#
+#########################################
+    def createCommandQueue(self):
+        self.command_queue = None
+        self.last_submit = threading.local()
+        if ( self.properties.stringForKey("command_queue", "yes") == "yes" ):
+            rate = self.properties.intForKey("frame_rate", 44)
+            limit = self.properties.intForKey("queue_limit", 4096)
+            self.command_queue = CommandQueue(self.layers, self.artnet_interface, rate, limit)
+            self.command_queue.startBuilding()
+
+#########################################
+#
+#   closeCommandQueue stops the frame builder thread
+#
+#########################################
+    def closeCommandQueue(self):
+        if ( self.command_queue != None ):
+            self.command_queue.stopBuilding()
+
+#########################################
+#
+#   createLocalControl
+#      if local_control is not empty, creates shared memory segments
+#      local_control_in and local_control_out for processes on this host
+#      levels written to _in are set in the layer "local"
+#
+#########################################
+    def createLocalControl(self):
+        self.local_control = None
+        name = self.properties.stringForKey("local_control", "")
+        if ( name != "" ):
+            priority = self.properties.intForKey("local_control_priority", self.layers.default_priority)
+            self.layers.setPriority("local", priority)
+            rate = self.properties.intForKey("frame_rate", 44)
+            self.local_control = LocalControl(self.artnet_interface, name, self.set_local, rate)
+            self.local_control.start()
+            print("Local control: %s_in %s_out" % (name, name))
+
+    def closeLocalControl(self):
+        if ( self.local_control != None ):
+            self.local_control.stop()
+
+    def set_local(self, pairs):
+        if ( self.command_queue != None ):
+            self.command_queue.submit("local", pairs)
+        else:
+            self.layers.setValues("local", pairs)
+            self.artnet_interface.sendDMXNow()
+
+#########################################
+#
+#   loadPixelMap
+#      pixel_map-> JSON file mapping image pixels onto fixtures
+#         relative to this directory, empty for none
+#   pixelFrameSize returns bytes in an RGB frame, 0 without a map
+#   apply_pixels writes a frame's pixels to output and sends it
+#      returns the output generation
+#
+#########################################
+    def loadPixelMap(self):
+        self.pixel_map = None
+        path = self.properties.stringForKey("pixel_map", "")
+        if ( path != "" ):
+            try:
+                size = len(self.artnet_interface.level_buffer)
+                self.pixel_map = PixelMap.loadPixelMap(os.path.join(self.appdirectory, path), size)
+                print("Pixel map: %d x %d, %d slots" % (self.pixel_map.width, self.pixel_map.height,
+                                                        len(self.pixel_map.slots)))
+            except (OSError, ValueError) as e:
+                print ("Pixel map error: ", e)
+
+    def pixelFrameSize(self):
+        if ( self.pixel_map == None ):
+            return 0
+        return self.pixel_map.frameSize()
+
+    def apply_pixels(self, frame):
+        interface = self.artnet_interface
+        with interface.lock:
+            self.pixel_map.mapFrame(frame, interface.level_buffer)
+        interface.sendDMXNow()
+        return interface.generation
+
+#########################################
+#
+#   loadCueList
+#      cue_list-> JSON file of cues and triggers (see CueList.py)
+#         relative to this directory, empty for none
+#      cue_priority-> priority of the layer "cues"
+#      cues are scheduled on the output's event loop
+#
+#########################################
+    def loadCueList(self):
+        self.cue_list = None
+        path = self.properties.stringForKey("cue_list", "")
+        if ( path != "" ):
+            priority = self.properties.intForKey("cue_priority", self.layers.default_priority)
+            self.set_layer_priority("cues", priority)
+            self.artnet_interface.startLoop()
+            cue_list = CueList(self, CueScheduler(self.artnet_interface))
+            try:
+                CueList.loadCueList(cue_list, os.path.join(self.appdirectory, path), self.presets)
+                for cue in cue_list.cues:
+                    self.createBatch().addOperation("cue %s" % cue.number, cue.levels, None, 0)
+            except (OSError, ValueError) as e:
+                print ("Cue list error: ", e)
+                return
+            self.cue_list = cue_list
+            self.artnet_interface.callOnLoop(cue_list.start)
+            print("Cue list: %d cues, %d triggers" % (len(cue_list.cues), len(cue_list.triggers)))
+
+#########################################
+#
+#   cue_go starts cue number, or the next cue if number is None
+#      raises ValueError if there is no such cue
+#   cue_stop cancels waiting and follow
+#   cue_status returns dictionary for JSON reply or None if there is no cue list
+#
+#   the cue list is only used on the interface's event loop,
+#   cueOnLoop calls method there and waits for its result
+#
+#########################################
+    def cue_go(self, number=None):
+        self.cueOnLoop(self.cue_list.go, number)
+
+    def cue_stop(self):
+        self.cueOnLoop(self.cue_list.stopCue)
+
+    def cue_status(self):
+        if ( self.cue_list == None ):
+            return None
+        return self.cueOnLoop(self.cue_list.status)
+
+    def cueOnLoop(self, method, *args):
+        future = concurrent.futures.Future()
+        def call():
+            try:
+                future.set_result(method(*args))
+            except Exception as e:
+                future.set_exception(e)
+        self.artnet_interface.callOnLoop(call)
+        return future.result()
+
+#########################################
+#
+#   createProfiler
+#      if profiling is yes, profiles can be requested at /profile
+#      the output and layer locks are timed during a profile
+#
+#########################################
+    def createProfiler(self):
+        self.profiler = None
+        if ( self.properties.stringForKey("profiling", "no") == "yes" ):
+            self.profiler = Profiler()
+            self.profiler.addLock(self.artnet_interface, "lock", "output")
+            self.profiler.addLock(self.layers, "lock", "layers")
+
+    def profiling(self):
+        return self.profiler != None
+
+    def profile(self, seconds, interval):
+        return self.profiler.profile(seconds, interval)
+
+#########################################
+#
+#   createDimmerCurves reads curve definitions and assignments
+#      from properties
+#
+#########################################
+    def createDimmerCurves(self):
+        curves = DimmerCurves(len(self.artnet_interface.level_buffer))
+        try:
+            curves.loadProperties(self.properties)
+        except ValueError as e:
+            print("Dimmer curve error: ", e)
+        return curves
 
 #########################################
 #
@@ -103,6 +441,27 @@ class web2DMX:
 #########################################
     def createWebServer(self):
         self.web_server = web2dmxServer(self, self.hostname, self.serverport)
+        self.createCommandListener()
+
+#########################################
+#
+#   createCommandListener
+#      if udp_command_port is not 0, levels can be set with
+#      set and setl queries or OSC messages sent to that UDP port
+#
+#########################################
+    def createCommandListener(self):
+        self.command_listener = None
+        port = self.properties.intForKey("udp_command_port", 0)
+        if ( port != 0 ):
+            self.command_listener = UDPCommandListener(self, self.web_server, self.artnet_interface,
+                                                       self.hostname, port)
+            self.command_listener.start()
+            print("UDP commands on port %d" % port)
+
+    def closeCommandListener(self):
+        if ( self.command_listener != None ):
+            self.command_listener.stop()
 
 #########################################
 #
@@ -110,15 +469,150 @@ class web2DMX:
 #      f ->HTTP output stream for writing
 #      a-> dmx address (1 to 512)
 #      v-> level  (0 to 100 percent)
+#      layer-> key of layer to set address in
+#
+#########################################
+    def do_set(self, f, a, v, layer=None):
+        if ( f != None ):
+            f.write(bytes("<p>Address %s at %s </p>" % (a, v), "utf-8"))
+        pairs = [(int(a), ArtNetInterface.level2dmx(v))]
+        if ( self.command_queue != None ):
+            self.last_submit.seq = self.command_queue.submit(layer, pairs)
+        else:
+            self.layers.setValues(layer, pairs)
+
+#########################################
+#
+#   set_layer_priority and release_layer
+#      change the layer belonging to a client
+#
+#########################################
+    def set_layer_priority(self, layer, priority):
+        if ( self.command_queue != None ):
+            self.last_submit.seq = self.command_queue.submitPriority(layer, priority)
+        else:
+            self.layers.setPriority(layer, priority)
+
+    def release_layer(self, layer):
+        if ( self.command_queue != None ):
+            self.last_submit.seq = self.command_queue.submitRelease(layer)
+        else:
+            self.layers.release(layer)
+
+#########################################
+#
+#   loadPresets
+#      preset_NAME=AxV_AxV... in properties defines a preset
+#      with addresses at levels (0-100) like a set query
+#
+#########################################
+    def loadPresets(self):
+        self.presets = {}
+        for key, value in self.properties.properties.items():
+            if ( key.startswith("preset_") ):
+                pairs = []
+                for sp in value.split("_"):
+                    scv = sp.split("x")
+                    if ( len(scv) == 2 ):
+                        pairs.append((int(scv[0]), ArtNetInterface.level2dmx(scv[1])))
+                self.presets[key[7:]] = pairs
+
+#########################################
+#
+#   createBatch returns an empty BatchRequest
+#   apply_batch applies all of the batch's sets and fades in one frame
+#      returns the output generation after the frame is sent
+#         or None if waiting for the frame timed out
+#      wait-> False to return without waiting for the frame
+#      raises ValueError if the batch cannot be applied
 #
 #########################################
-    def do_set(self, f, a, v):
-        f.write(bytes("<p>Address %s at %s </p>" % (a, v), "utf-8"))
-        self.artnet_interface.setDMXLevel(int(a), v)
+    def createBatch(self):
+        return BatchRequest(len(self.artnet_interface.level_buffer), self.presets)
 
-    def query_complete(self, f):
+    def apply_batch(self, layer, batch, wait=True):
+        if ( self.command_queue != None ):
+            seq = self.command_queue.submitBatch(layer, batch.sets(), batch.fades())
+            if ( wait and not self.command_queue.waitApplied(seq) ):
+                return None
+            return self.command_queue.applied_generation
+        if ( len(batch.fades()) > 0 ):
+            raise ValueError("fades require command_queue=yes")
+        slots = []
+        self.layers.setValues(layer, batch.sets(), slots)
+        self.artnet_interface.setDMXSlots(slots)
         self.artnet_interface.sendDMXNow()
-        if ( self.html_table == "yes"):
+        return self.artnet_interface.generation
+
+#########################################
+#
+#   accepting returns False if requests should be refused
+#      because the command queue is full
+#
+#########################################
+    def accepting(self):
+        return self.command_queue == None or self.command_queue.accepting()
+
+#########################################
+#
+#   createEventClient returns a LevelEventClient receiving level changes
+#   closeEventClient stops sending changes to the client
+#
+#########################################
+    def createEventClient(self):
+        client = LevelEventClient(self.artnet_interface)
+        self.artnet_interface.addFrameListener(client)
+        return client
+
+    def closeEventClient(self, client):
+        self.artnet_interface.removeFrameListener(client)
+
+#########################################
+#
+#   stateTag returns an ETag for the current output levels
+#      made from the time this object was created and the output generation
+#
+#########################################
+    def stateTag(self):
+        return '"%x-%d"' % (self.start_tag, self.artnet_interface.generation)
+
+#########################################
+#
+#   stateDelta returns slots changed since generation
+#      or a full snapshot if since is too old or epoch is not this server's
+#      as a dictionary, or bytes if binary is True (see LevelHistory.py)
+#
+#########################################
+    def stateDelta(self, since, epoch=None, binary=False):
+        if ( binary ):
+            return self.history.binaryDelta(since, epoch)
+        return self.history.delta(since, epoch)
+
+#########################################
+#
+#   getLevel returns level (0-100) of address a
+#
+#########################################
+    def getLevel(self, a):
+        return self.artnet_interface.getDMXLevel(int(a))
+
+#########################################
+#
+#   query_complete sends DMX
+#      or waits for the frame builder to send this thread's last submission
+#      if wait is False the frame builder sends without waiting
+#      if f is not None, writes the table of levels to f
+#      returns False if waiting for the frame builder timed out
+#
+#########################################
+    def query_complete(self, f, wait=True):
+        applied = True
+        if ( self.command_queue == None ):
+            self.artnet_interface.sendDMXNow()
+        elif ( wait ):
+            seq = getattr(self.last_submit, "seq", 0)
+            applied = self.command_queue.waitApplied(seq)
+        if ( f != None and self.html_table == "yes"):
             f.write(bytes("<table border=1px>\n", "utf-8"))
             f.write(bytes("<tr><td width=30> </td>", "utf-8"))
             a = 1
@@ -141,6 +635,7 @@ class web2DMX:
                     a = a + 1
                 f.write(bytes("</tr\n>", "utf-8"))
             f.write(bytes("</table>\n", "utf-8"))
+        return applied
 
 #########################################
 #
@@ -216,4 +711,9 @@ if __name__ == "__main__":
     web2dmx.createWebServer()
 
     web2dmx.web_server.runWebServer()
-    web2dmx.web_server.closeWebServer()
\ No newline at end of file
+    web2dmx.web_server.closeWebServer()
+    web2dmx.closeCommandListener()
+    web2dmx.closeCommandQueue()
+    web2dmx.closeRecorder()
+    web2dmx.closeLocalControl()
+    web2dmx.artnet_interface.close()
\ No newline at end of file
@@ -7,8 +7,10 @@
 #  https://www.claudeheintzdesign.com/lx/opensource.html
 #
 
-from http.server import HTTPServer
+from http.server import ThreadingHTTPServer
 from myRequestHandler import myRequestHandler
+import time
+import json
 
 #################################################################
 #
@@ -22,6 +24,38 @@ from myRequestHandler import myRequestHandler
 #      multiple AxV pairs can be added, separated by underscores
 #      (example example 10.110.111.4:/?set10x35_20x45, 10@35% and 20@45%)
 #
+#   adding &response=none replies 204 No Content
+#   adding &response=json (or Accept: application/json) replies with
+#      only the addresses set and their levels, {"1": 50, "2": 60}
+#
+#   URL address:port/ replies with the table of levels and an ETag
+#      If-None-Match with the current ETag replies 304 Not Modified
+#
+#   URL address:port/events is a Server-Sent Events stream of level changes
+#
+#   each client sets levels in its own layer, the client's ip address
+#   or &token=NAME.  &priority=N sets the layer's priority (default 100)
+#   the highest priority layer sets an address.  &release removes the layer.
+#
+#   replies 503 with Retry-After when the owner is not accepting requests
+#
+#   URL address:port/state?since=G&epoch=E replies with the slots changed
+#      since generation G as JSON, or binary with &format=binary
+#      a full snapshot is sent if G is too old or E is not the server's epoch
+#
+#   URL address:port/cues replies with the cue list's status
+#      ?go (next cue) or ?go=N starts a cue, ?stop cancels waits and follows
+#
+#   URL address:port/profile?seconds=S&interval_ms=I samples every thread
+#      for S seconds and replies with a text profile (if profiling=yes)
+#
+#   POST to address:port/batch with a JSON or application/octet-stream body
+#      applies a list of operations in a single frame (see BatchRequest.py)
+#      and replies with JSON timing of each operation
+#
+#   POST to address:port/pixels with a body of one or more RGB frames
+#      maps each frame onto pixel fixtures as it is received (see PixelMap.py)
+#
 #########################################
 class web2dmxServer:
 
@@ -40,7 +74,8 @@ class web2dmxServer:
 #
 #########################################
     def createWebServer(self, hostname, serverport):
-        self.web_server = HTTPServer((hostname, serverport), myRequestHandler)
+        self.web_server = ThreadingHTTPServer((hostname, serverport), myRequestHandler)
+        self.web_server.daemon_threads = True
         myRequestHandler.setOwner(self)
 
 #########################################
@@ -76,31 +111,401 @@ class web2dmxServer:
 #########################################
     def doGet(self, rh, p, q):
         if ( p == "/" ):
+            if ( q == None ):
+                self.doStateGet(rh)
+                return
+            if ( not self.owner.accepting() ):
+                rh.respondWithContent(503, "text/plain", b"Busy", {"Retry-After": "1"})
+                return
+            try:
+                layer = self.layerForRequest(rh, q)
+            except ValueError:
+                rh.respond(400)
+                return
+            mode = self.responseMode(rh, q)
+            if ( mode != "html" ):
+                self.doQuietGet(rh, q, mode, layer)
+                return
             wfile = rh.respond(200)
             rh.writeHTMLHeader("pylx")
-            if ( q != None ):
-                self.do_query(wfile, q)
-            else:
-                self.owner.query_complete( wfile )
+            self.do_query(wfile, q, layer)
             rh.endHTMLBody()
+        elif ( p == "/events" ):
+            self.doEvents(rh)
+        elif ( p == "/cues" ):
+            self.doCues(rh, q)
+        elif ( p == "/state" ):
+            self.doState(rh, q)
+        elif ( p == "/profile" ):
+            self.doProfile(rh, q)
         else:
             rh.respond(400)
+
 #########################################
 #
-#   do_QUERY processes query portion of url from a get request
-#      does nothing if query is not handled
+#   doEvents
+#      streams level change events until the client disconnects
+#      a comment is sent as a keep alive when nothing changes
+#
+#########################################
+    def doEvents(self, rh):
+        wfile = rh.respondEventStream()
+        client = self.owner.createEventClient()
+        try:
+            while True:
+                event = client.nextEvent(15)
+                if ( event == None ):
+                    event = b": keepalive\n\n"
+                wfile.write(event)
+                wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.owner.closeEventClient(client)
+
+#########################################
+#
+#   doCues
+#      controls the cue list and replies with its status as JSON
+#      404 if there is no cue list, 400 if there is no such cue
+#
+#########################################
+    def doCues(self, rh, q):
+        if ( self.owner.cue_status() == None ):
+            rh.respond(404)
+            return
+        try:
+            if ( q != None ):
+                for item in q.split("&"):
+                    kv = item.split("=")
+                    if ( kv[0] == "go" ):
+                        if ( len(kv) == 2 and kv[1] != "" and kv[1] != "next" ):
+                            self.owner.cue_go(kv[1])
+                        else:
+                            self.owner.cue_go()
+                    elif ( kv[0] == "stop" ):
+                        self.owner.cue_stop()
+        except ValueError as e:
+            body = bytes(json.dumps({"error": str(e)}), "utf-8")
+            rh.respondWithContent(400, "application/json", body)
+            return
+        body = json.dumps(self.owner.cue_status())
+        rh.respondWithContent(200, "application/json", bytes(body, "utf-8"), {"Cache-Control": "no-cache"})
+
+#########################################
+#
+#   doState
+#      replies with output changes since a generation for mirrors
 #
 #########################################
-    def do_query(self, f, query):
-        qpts = query.split("&")
-        if (len(qpts) > 0):
-            for q in qpts:
+    def doState(self, rh, q):
+        since = None
+        epoch = None
+        binary = ( "application/octet-stream" in rh.headers.get("Accept", "") )
+        try:
+            for k, v in self.queryItems(q):
+                if ( k == "since" ):
+                    since = int(v)
+                elif ( k == "epoch" ):
+                    epoch = int(v)
+                elif ( k == "format" ):
+                    binary = ( v.lower() == "binary" )
+        except ValueError:
+            rh.respond(400)
+            return
+        headers = {"Cache-Control": "no-cache"}
+        if ( binary ):
+            body = self.owner.stateDelta(since, epoch, True)
+            rh.respondWithContent(200, "application/octet-stream", body, headers)
+        else:
+            body = json.dumps(self.owner.stateDelta(since, epoch), separators=(",", ":"))
+            rh.respondWithContent(200, "application/json", bytes(body, "utf-8"), headers)
+
+#########################################
+#
+#   doProfile
+#      replies with a profile of the next seconds (default 5)
+#      404 if profiling is disabled, 409 if a profile is already running
+#
+#########################################
+    def doProfile(self, rh, q):
+        seconds = 5.0
+        interval = 1.0
+        try:
+            for k, v in self.queryItems(q):
+                if ( k == "seconds" ):
+                    seconds = float(v)
+                elif ( k == "interval_ms" ):
+                    interval = float(v)
+        except ValueError:
+            rh.respond(400)
+            return
+        if ( not self.owner.profiling() ):
+            rh.respond(404)
+            return
+        report = self.owner.profile(seconds, interval / 1000.0)
+        if ( report == None ):
+            rh.respondWithContent(409, "text/plain", b"Profile already running")
+            return
+        rh.respondWithContent(200, "text/plain", bytes(report, "utf-8"))
+
+#########################################
+#
+#   doStateGet
+#      replies with the table of levels tagged with the output generation
+#      replies 304 Not Modified if the request's If-None-Match has the current tag
+#
+#########################################
+    def doStateGet(self, rh):
+        etag = self.owner.stateTag()
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if ( self.tagMatches(rh.headers.get("If-None-Match"), etag) ):
+            rh.respondWithContent(304, headers=headers)
+            return
+        wfile = rh.respond(200, headers)
+        rh.writeHTMLHeader("pylx")
+        self.owner.query_complete( wfile )
+        rh.endHTMLBody()
+
+    def tagMatches(self, inm, etag):
+        if ( inm == None ):
+            return False
+        for t in inm.split(","):
+            t = t.strip()
+            if ( t.startswith("W/") ):
+                t = t[2:]
+            if ( t == etag or t == "*" ):
+                return True
+        return False
+
+#########################################
+#
+#   doPost (myRequestHandler owner method)
+#      called in response to a POST request
+#       rh request handler for sending response
+#       p path to resource
+#       q query
+#       body request content
+#
+#########################################
+    def doPost(self, rh, p, q, body):
+        if ( p == "/batch" ):
+            self.doBatch(rh, q, body)
+        else:
+            rh.respond(400)
+
+#########################################
+#
+#   streamsPost (myRequestHandler owner method)
+#      returns True if the body of a POST to p is read by doPostStream
+#
+#########################################
+    def streamsPost(self, p):
+        return ( p == "/pixels" )
+
+#########################################
+#
+#   doPostStream (myRequestHandler owner method)
+#      called in response to a POST request to a streamed path
+#       length of body to be read from rh.rfile
+#
+#########################################
+    def doPostStream(self, rh, p, q, length):
+        if ( p == "/pixels" ):
+            self.doPixels(rh, length)
+        else:
+            rh.respond(400)
+
+#########################################
+#
+#   doPixels
+#      applies each frame of the body as soon as it has been read
+#      so a client can stream video in a single request
+#      404 if there is no pixel map, 400 if the body is not whole frames
+#
+#########################################
+    def doPixels(self, rh, length):
+        size = self.owner.pixelFrameSize()
+        if ( size == 0 or length == 0 or length % size != 0 ):
+            rh.close_connection = True
+            rh.respond(404 if size == 0 else 400)
+            return
+        frames = 0
+        generation = 0
+        while ( frames * size < length ):
+            frame = rh.rfile.read(size)
+            if ( len(frame) != size ):
+                rh.close_connection = True
+                return
+            generation = self.owner.apply_pixels(frame)
+            frames += 1
+        body = json.dumps({"frames": frames, "generation": generation})
+        rh.respondWithContent(200, "application/json", bytes(body, "utf-8"))
+
+#########################################
+#
+#   doBatch
+#      validates every operation then applies all of them in one frame
+#      replies 400 with an error message if any operation is not valid
+#
+#########################################
+    def doBatch(self, rh, q, body):
+        if ( not self.owner.accepting() ):
+            rh.respondWithContent(503, "text/plain", b"Busy", {"Retry-After": "1"})
+            return
+        t0 = time.perf_counter()
+        batch = self.owner.createBatch()
+        try:
+            if ( "octet-stream" in rh.headers.get("Content-Type", "") ):
+                batch.parseBinary(body)
+            else:
+                batch.parseJSON(body)
+            layer = self.layerForRequest(rh, q)
+            if ( batch.token != None ):
+                layer = "token:" + batch.token
+            if ( batch.priority != None ):
+                self.owner.set_layer_priority(layer, batch.priority)
+            t1 = time.perf_counter()
+            generation = self.owner.apply_batch(layer, batch)
+        except ValueError as e:
+            body = bytes(json.dumps({"error": str(e)}), "utf-8")
+            rh.respondWithContent(400, "application/json", body)
+            return
+        if ( generation == None ):
+            self.respondNotApplied(rh)
+            return
+        t2 = time.perf_counter()
+        result = {"generation": generation,
+                  "parse_us": int((t1 - t0) * 1000000),
+                  "apply_us": int((t2 - t1) * 1000000),
+                  "ops": [{"op": name, "slots": n, "us": us} for name, n, us in batch.ops]}
+        rh.respondWithContent(200, "application/json", bytes(json.dumps(result), "utf-8"))
+
+#########################################
+#
+#   layerForRequest
+#      returns the key of the layer a request sets levels in
+#      token= in the query, otherwise the client's ip address
+#      priority= in the query sets the layer's priority
+#
+#########################################
+    def layerForRequest(self, rh, q):
+        layer = rh.client_address[0]
+        priority = None
+        for k, v in self.queryItems(q):
+            if ( k == "token" ):
+                layer = "token:" + v
+            elif ( k == "priority" ):
+                priority = int(v)
+        if ( priority != None ):
+            self.owner.set_layer_priority(layer, priority)
+        return layer
+
+#########################################
+#
+#   responseMode
+#      returns "none", "json" or "html" from the query's response=
+#      or from the request's Accept header
+#
+#########################################
+    def responseMode(self, rh, q):
+        for k, v in self.queryItems(q):
+            if ( k == "response" ):
+                v = v.lower()
+                if ( v == "none" or v == "json" ):
+                    return v
+                return "html"
+        accept = rh.headers.get("Accept", "")
+        if ( "application/json" in accept ):
+            return "json"
+        return "html"
+
+#########################################
+#
+#   doQuietGet
+#      applies all set and setl pairs, sends once and replies
+#      with no content or JSON of the addresses that were set
+#
+#########################################
+    def doQuietGet(self, rh, q, mode, layer):
+        try:
+            pairs, applied = self.apply_query(q, layer, mode == "json")
+        except (ValueError, OverflowError, IndexError):
+            rh.respondWithContent(400)
+            return
+        if ( not applied ):
+            self.respondNotApplied(rh)
+            return
+        if ( mode == "none" ):
+            rh.respondWithContent(204)
+        else:
+            levels = {}
+            for a, v in pairs:
+                levels[str(a)] = self.owner.getLevel(a)
+            rh.respondWithContent(200, "application/json", bytes(json.dumps(levels), "utf-8"))
+
+#########################################
+#
+#   queryItems returns list of (lowercase key, value) pairs in the query
+#
+#########################################
+    def queryItems(self, query):
+        items = []
+        if ( query != None ):
+            for q in query.split("&"):
                 qt = q.split("=")
                 if ( len(qt) == 2):
-                    if ( qt[0].lower() == "set"):
-                        self.do_set_query(f, qt[1])
-                    elif ( qt[0].lower() == "setl"):
-                        self.do_setl_query(f, qt[1])
+                    items.append((qt[0].lower(), qt[1]))
+        return items
+
+#########################################
+#
+#   do_QUERY processes query portion of url from a get request
+#      does nothing if query is not handled
+#
+#########################################
+    def do_query(self, f, query, layer=None):
+        for k, v in self.queryItems(query):
+            if ( k == "set"):
+                self.do_set_query(f, v, layer)
+            elif ( k == "setl"):
+                self.do_setl_query(f, v, layer)
+            elif ( k == "release"):
+                self.owner.release_layer(layer)
+                self.owner.query_complete( f )
+
+#########################################
+#
+#   apply_query sets every address in the query's set and setl pairs
+#      without writing a response, then completes the query once
+#      wait-> False to return before the levels are sent
+#      returns (list of (address, value) pairs, False if waiting timed out)
+#
+#########################################
+    def apply_query(self, query, layer=None, wait=True):
+        pairs = []
+        for k, v in self.queryItems(query):
+            if ( k == "set"):
+                pairs.extend(self.setPairs(v))
+            elif ( k == "setl"):
+                pairs.extend(self.setlPairs(v))
+            elif ( k == "release"):
+                self.owner.release_layer(layer)
+        for a, v in pairs:
+            self.owner.do_set( None, a, v, layer)
+        applied = self.owner.query_complete( None, wait )
+        return (pairs, applied)
+
+#########################################
+#
+#   respondNotApplied
+#      replies 503 when levels were queued but the frame builder
+#      did not send them before the wait timed out
+#
+#########################################
+    def respondNotApplied(self, rh):
+        body = bytes(json.dumps({"error": "levels were not applied before timeout", "applied": False}), "utf-8")
+        rh.respondWithContent(503, "application/json", body, {"Retry-After": "1"})
 
 #########################################
 #
@@ -109,15 +514,23 @@ class web2dmxServer:
 #      sends owner a do_set message for each 
 #
 #########################################
-    def do_setl_query(self, f, sv ):
+    def do_setl_query(self, f, sv, layer=None ):
+        pairs = self.setlPairs(sv)
+        if ( len(pairs) > 0 ):
+            for a, v in pairs:
+                self.owner.do_set( f, a, v, layer)
+            self.owner.query_complete( f )
+
+    def setlPairs(self, sv):
+        pairs = []
         spts = sv.split("x")
         if ( len(spts) == 2 ):
             addr = int(spts[0])
             varr = spts[1].split("_")
             for v in varr:
-                self.owner.do_set( f, addr, v)
+                pairs.append((addr, v))
                 addr = addr + 1
-            self.owner.query_complete( f )
+        return pairs
 
 
 #########################################
@@ -126,10 +539,18 @@ class web2dmxServer:
 #      sends owner a do_set message for each 
 #
 #########################################
-    def do_set_query(self, f, sv ):
+    def do_set_query(self, f, sv, layer=None ):
+        pairs = self.setPairs(sv)
+        if ( len(pairs) > 0 ):
+            for a, v in pairs:
+                self.owner.do_set( f, a, v, layer)
+            self.owner.query_complete( f )
+
+    def setPairs(self, sv):
+        pairs = []
         spts = sv.split("_")
         for sp in spts:
             scv = sp.split("x")
             if ( len(scv) == 2 ):
-                self.owner.do_set( f, scv[0], scv[1])
-                self.owner.query_complete( f )
+                pairs.append((int(scv[0]), scv[1]))
+        return pairs